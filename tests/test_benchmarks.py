@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 16:30$"
+
+
+import contextlib
+import doctest
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from yail import benchmarks
+
+from yail.__main__ import (
+    main,
+)
+
+from yail.benchmarks import (
+    BENCHMARKS,
+    KINDS,
+    SIZE_ONLY,
+    SIZES,
+    compare,
+    make_input,
+    run,
+    run_benchmark,
+)
+
+from builtins import (
+    range,
+)
+
+
+@contextlib.contextmanager
+def redirect_stderr(stream):
+    # ``contextlib.redirect_stderr`` needs Python 3.5.
+    stderr, sys.stderr = sys.stderr, stream
+    try:
+        yield stream
+    finally:
+        sys.stderr = stderr
+
+
+# Load doctests from `benchmarks`.
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(benchmarks))
+    return tests
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+
+    def test_make_input(self):
+        for kind in KINDS:
+            assert list(make_input(kind, 5)) == list(range(5))
+
+        with self.assertRaises(AssertionError):
+            make_input("tuple", 5)
+
+
+    def test_sizes(self):
+        assert SIZES[0] == 10 ** 2
+        assert SIZES[-1] == 10 ** 8
+
+
+    def test_run_benchmark(self):
+        for name in BENCHMARKS:
+            for kind in KINDS:
+                result = run_benchmark(name, kind, 1000, repeat=1)
+                assert result["name"] == name
+                assert result["seconds"] > 0
+                assert result["ops_per_sec"] > 0
+                assert result["ns_per_element"] > 0
+                assert result["tracemalloc_peak"] >= 0
+
+        with self.assertRaises(AssertionError):
+            run_benchmark("pad", "list", 10, repeat=0)
+
+
+    def test_run(self):
+        results = list(run(kinds=["list", "generator"], sizes=[10, 100],
+                           repeat=1))
+
+        assert len(results) == (
+            2 * 2 * (len(BENCHMARKS) - len(SIZE_ONLY)) + 2 * len(SIZE_ONLY)
+        )
+        assert [r["size"] for r in results[:4]] == [10, 10, 100, 100]
+        assert set(r["name"] for r in results) == set(BENCHMARKS)
+        assert all(
+            (r["kind"] is None) == (r["name"] in SIZE_ONLY) for r in results
+        )
+
+
+    def test_compare(self):
+        def result(name, ns, peak):
+            return {"name": name, "kind": "list", "size": 10,
+                    "ns_per_element": ns, "tracemalloc_peak": peak}
+
+        old = [result("pad", 10.0, 100), result("split", 10.0, 0),
+               result("cycles", 10.0, 100)]
+        new = [result("pad", 10.5, 300), result("split", 5.0, 50),
+               result("disperse", 10.0, 100)]
+
+        rows = compare(old, new)
+        assert [r["name"] for r in rows] == ["pad", "split"]
+        assert [r["regressed"] for r in rows] == [False, False]
+        assert rows[0]["memory"] == 3.0
+        assert rows[1]["speed"] == 2.0
+        assert rows[1]["memory"] is None
+
+        rows = compare(old, new, threshold=0.01)
+        assert [r["regressed"] for r in rows] == [True, False]
+
+        rows = compare(old, new, memory_threshold=1.0)
+        assert [r["regressed"] for r in rows] == [True, False]
+
+
+    def test_main(self):
+        old = os.path.join(self.temp_dir, "old.json")
+        new = os.path.join(self.temp_dir, "new.json")
+        args = ["bench", "--names", "pad,subrange", "--kinds", "range",
+                "--sizes", "100", "--repeat", "1"]
+
+        err = io.StringIO()
+        with redirect_stderr(err):
+            assert main(args + ["-o", old]) == 0
+        assert "ns/element" in err.getvalue()
+
+        with open(old) as f:
+            report = json.load(f)
+        assert report["results"][0]["name"] == "pad"
+        assert report["results"][1]["kind"] is None
+        assert "peak_rss" not in report["results"][0]
+        if benchmarks.resource is not None:
+            assert report["peak_rss"] > 0
+        else:
+            assert report["peak_rss"] is None
+
+        out = io.StringIO()
+        with redirect_stderr(io.StringIO()):
+            with contextlib.redirect_stdout(out):
+                main(args + ["-o", new, "--compare", old])
+        assert out.getvalue().startswith("name")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert main(["compare", old, old]) == 0
+
+        with open(new) as f:
+            report = json.load(f)
+        for each in report["results"]:
+            each["ns_per_element"] *= 2
+        with open(new, "w") as f:
+            json.dump(report, f)
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            assert main(["compare", old, new]) == 1
+        assert "REGRESSED" in out.getvalue()
+
+        with redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(["bench", "--names", "missing"])
+
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
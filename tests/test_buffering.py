@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 10:12$"
+
+
+import doctest
+import itertools
+import random
+import sys
+import threading
+import unittest
+
+from yail import buffering
+
+from yail.buffering import (
+    Budget,
+    BudgetExceeded,
+    BufferMetrics,
+    set_budget,
+    spill_limit,
+    tee,
+)
+
+from yail.core import (
+    cycles,
+    disperse,
+    sliding_window_filled,
+    split,
+)
+
+from builtins import (
+    range,
+)
+
+
+# Load doctests from `buffering`.
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(buffering))
+    return tests
+
+
+class TestBuffering(unittest.TestCase):
+    def setUp(self):
+        pass
+
+
+    def test_tee(self):
+        assert type(tee(range(3))) is type(itertools.tee(range(3)))
+        assert tee(range(3), 0) == ()
+
+        a, = tee(range(3), 1, limit=1)
+        assert list(a) == [0, 1, 2]
+
+        a, b = tee(iter([]), limit=1)
+        assert list(a) == list(b) == []
+
+
+    def test_tee_spill(self):
+        data = [(i, str(i)) for i in range(1000)]
+
+        for n in [2, 3, 5]:
+            for limit in [1, 7, 100, 10000]:
+                rng = random.Random(n * limit)
+                its = tee(iter(data), n, limit=limit)
+                shared = its[0]._shared
+
+                results = [[] for _ in range(n)]
+                active = list(range(n))
+                while active:
+                    i = rng.choice(active)
+                    try:
+                        results[i].append(next(its[i]))
+                    except StopIteration:
+                        active.remove(i)
+
+                    assert len(shared._mem) - shared._head <= limit
+
+                for each in results:
+                    assert each == data
+
+
+    def test_tee_lagging(self):
+        a, b = tee(iter(range(10000)), limit=10)
+        shared = a._shared
+
+        assert list(a) == list(range(10000))
+        assert len(shared._mem) == 10
+        assert len(shared._spill) == 9990
+        assert shared._spill._file.tell() > 0
+
+        assert list(itertools.islice(b, 5000)) == list(range(5000))
+        assert list(b) == list(range(5000, 10000))
+        assert len(shared._spill) == 0
+
+
+    def test_spill_limit(self):
+        assert buffering._options["spill_limit"] is None
+
+        with spill_limit(3):
+            a, b = tee(range(5))
+            assert isinstance(a, buffering._TeeBranch)
+
+            with spill_limit(None):
+                a, b = tee(range(5))
+                assert not isinstance(a, buffering._TeeBranch)
+
+            front, middle, back = split(10, iter(range(100)))
+            assert list(back) == list(range(11, 100))
+            assert list(middle) == [10]
+            assert list(front) == list(range(10))
+
+            assert list(cycles(iter([1, 2, 3]), 3)) == 3 * [1, 2, 3]
+
+            result = list(disperse(iter(range(100))))
+            assert result == list(disperse(range(100)))
+
+        assert buffering._options["spill_limit"] is None
+
+        with self.assertRaises(AssertionError):
+            with spill_limit(0):
+                pass
+
+
+    def test_budget(self):
+        assert buffering._options["budget"] is None
+
+        with Budget(10) as budget:
+            assert buffering._option("budget") is budget
+
+            front, middle, back = split(5, iter(range(20)))
+            assert list(front) == list(range(5))
+            assert budget.used == budget.usage["split"] == 5
+
+            assert list(middle) == [5]
+            assert list(back) == list(range(6, 20))
+            assert budget.used == 0
+            assert budget.peak == 6
+
+            a, b = tee(iter(range(20)), name="mine")
+            with self.assertRaises(BudgetExceeded):
+                list(a)
+            assert budget.usage["mine"] == 10
+
+            del a, b
+            assert budget.used == 0
+
+        assert buffering._options["budget"] is None
+
+        old = set_budget(Budget(3))
+        assert old is None
+        with self.assertRaises(BudgetExceeded):
+            list(cycles(iter(range(10)), 2))
+        assert set_budget(old).used == 0
+
+
+    def test_budget_sizeof(self):
+        with Budget(100, sizeof=len) as budget:
+            a, b = tee(iter(["abc", "de", "f"]))
+            list(a)
+            assert budget.used == 6
+            list(b)
+            assert budget.used == 0
+
+
+    def test_budget_spill(self):
+        with Budget(10, "spill") as budget:
+            a, b = tee(iter(range(1000)))
+            assert list(a) == list(range(1000))
+            assert budget.used == 10
+            assert len(a._shared._spill) == 990
+
+            assert list(b) == list(range(1000))
+            assert budget.used == 0
+
+            result = list(disperse(iter(range(100))))
+            assert result == list(disperse(range(100)))
+            assert budget.used == 0
+            assert budget.peak == 10
+
+
+    def test_budget_block(self):
+        with Budget(5, "block") as budget:
+            a, b = tee(iter(range(100)))
+
+            result = []
+            reader = threading.Thread(target=lambda: result.extend(a))
+            reader.start()
+            reader.join(0.1)
+            assert reader.is_alive()
+            assert budget.used == 5
+
+            assert list(b) == list(range(100))
+            reader.join()
+            assert result == list(range(100))
+            assert budget.used == 0
+            assert budget.peak == 5
+
+        # With only this thread reading, nothing else can free room.
+        with Budget(5, "block", timeout=0.1) as budget:
+            front, middle, back = split(2, iter(range(100)))
+            with self.assertRaises(BudgetExceeded):
+                list(back)
+
+
+    def test_scoped_threads(self):
+        seen = []
+        entered = threading.Event()
+        leave = threading.Event()
+
+        def scoped():
+            with Budget(7), spill_limit(3), BufferMetrics():
+                entered.set()
+                leave.wait()
+            seen.append(buffering._option("budget"))
+
+        other = threading.Thread(target=scoped)
+        other.start()
+        entered.wait()
+
+        # Another thread's ``with`` blocks do not apply here.
+        assert buffering._option("budget") is None
+        assert buffering._option("spill_limit") is None
+        assert buffering._option("metrics") is None
+
+        with Budget(5) as budget:
+            leave.set()
+            other.join()
+            assert buffering._option("budget") is budget
+        assert seen == [None]
+        assert buffering._option("budget") is None
+
+        old = set_budget(Budget(3))
+        try:
+            with Budget(4) as budget:
+                assert buffering._option("budget") is budget
+            assert buffering._option("budget").limit == 3
+        finally:
+            set_budget(old)
+
+
+    def test_budget_window(self):
+        with Budget(3) as budget:
+            it = sliding_window_filled(iter(range(10)), 3)
+            assert next(it) == (0, 1, 2)
+            assert budget.usage["sliding_window_filled"] == 3
+
+            assert list(it)[-1] == (7, 8, 9)
+            assert budget.used == 0
+
+            with self.assertRaises(BudgetExceeded):
+                list(sliding_window_filled(iter(range(10)), 4))
+            assert budget.used == 0
+
+        with Budget(3, "spill") as budget:
+            result = list(sliding_window_filled(iter(range(10)), 4))
+            assert result[0] == (0, 1, 2, 3)
+            assert budget.peak == 4
+            assert budget.used == 0
+
+
+    def test_metrics(self):
+        peaks = []
+        with BufferMetrics(lambda o: peaks.append(o.peak)) as metrics:
+            a, b = tee(iter(range(10)), name="tee")
+            assert a.occupancy is b.occupancy
+            assert list(itertools.islice(a, 4)) == [0, 1, 2, 3]
+            assert a.occupancy.live == 4
+            assert metrics.live["tee"] == 4
+            assert peaks == [1, 2, 3, 4]
+
+            assert list(b) == list(range(10))
+            assert a.occupancy.live == 6
+            assert list(a) == list(range(4, 10))
+            assert a.occupancy.live == 0
+            assert a.occupancy.peak == 6
+            assert metrics.peak["tee"] == 6
+
+            del a, b
+            assert len(metrics.buffers) == 0
+
+            it = cycles(iter(range(3)), 2)
+            assert list(it) == [0, 1, 2, 0, 1, 2]
+            assert metrics.peak["cycles"] == 3
+            assert metrics.live["cycles"] == 0
+
+            it = sliding_window_filled(iter(range(10)), 3)
+            assert next(it) == (0, 1, 2)
+            assert metrics.live["sliding_window_filled"] == 3
+            assert list(it)[-1] == (7, 8, 9)
+            assert metrics.live["sliding_window_filled"] == 0
+            assert metrics.peak["sliding_window_filled"] == 3
+
+        assert buffering._options["metrics"] is None
+        assert len(list(disperse(iter(range(100))))) == 100
+        assert "disperse" not in metrics.peak
+
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -4,12 +4,25 @@ __author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
 __date__ = "$Oct 20, 2016 11:43$"
 
 
+import collections
+import copy
 import doctest
+import gc
 import itertools
+import operator
+import pickle
 import sys
 import types
 import unittest
 
+from toolz.itertoolz import accumulate
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from yail import buffering
 from yail import core
 
 from yail.core import (
@@ -22,8 +35,18 @@ from yail.core import (
     indices,
     pad,
     sliding_window_filled,
+    sliding_window_blocks,
     subrange,
+    subrange_bounds,
+    partition_range,
+    partition_plan,
+    partition_weighted,
+    parallel_map,
+    adaptive_subrange,
     disperse,
+    shard,
+    from_state,
+    advance,
 )
 
 from builtins import (
@@ -33,12 +56,72 @@ from builtins import (
 )
 
 
+def sum_range(r):
+    return sum(r)
+
+
+def fail_on_three(r):
+    if 3 in r:
+        raise ValueError("found 3")
+    return list(r)
+
+
 # Load doctests from `types`.
 def load_tests(loader, tests, ignore):
     tests.addTests(doctest.DocTestSuite(core))
     return tests
 
 
+def drain(it):
+    collections.deque(it, maxlen=0)
+
+
+def traced_peak(func):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def make_iterators(infinite=True):
+    """ A fresh one of each kind of input tests iterate over. """
+
+    result = [
+        list(range(11)),
+        subrange(0, 23, 4),
+        subrange(0, 23, 4, halo_before=1, halo_after=2),
+        indices(3, 4, 5),
+        indices(0, 3),
+        indices(2, 0),
+        indices(),
+        cycles([1, 2, 3], 4),
+        cycles([], 4),
+        cycles([], None),
+        duplicate(range(5), 3),
+        duplicate(range(5), 0),
+        pad(range(4), before=3, after=2, fill=-1),
+        sliding_window_filled(range(6), 3),
+        sliding_window_filled(range(6), 3, True, True, -1),
+        sliding_window_filled([1], 3, pad_after=True),
+        disperse(range(37)),
+        shard(indices(4, 5), 1, 3),
+        shard(range(50), 2, 7),
+        iter(range(11)),
+        (i for i in range(20)),
+    ]
+
+    if infinite:
+        result += [
+            cycles(range(3), None),
+            pad((1, 2), after=None),
+        ]
+
+    return result
+
+
 class TestYail(unittest.TestCase):
     def setUp(self):
         pass
@@ -99,6 +182,11 @@ class TestYail(unittest.TestCase):
         assert list(duplicate([1, 2, 3], 2)) == [1, 1, 2, 2, 3, 3]
         assert list(duplicate([1, 2, 3], 3)) == [1, 1, 1, 2, 2, 2, 3, 3, 3]
 
+        # Sequences without constant time indexing are iterated instead.
+        result = duplicate(collections.deque([1, 2, 3]), 2)
+        assert not isinstance(result, core._Indexable)
+        assert list(result) == [1, 1, 2, 2, 3, 3]
+
 
     def test_split(self):
         l = []
@@ -130,6 +218,16 @@ class TestYail(unittest.TestCase):
         assert list(map(tuple, split(2, l))) == [(10, 20),
                                                  (30,),
                                                  (40, 50)]
+        assert list(split(1, l)[2][1::2]) == [40]
+        assert list(shard(l, 1, 2)) == [20, 40]
+
+        # Sequences without constant time indexing are buffered instead.
+        l = collections.deque([10, 20, 30, 40, 50])
+        portions = split(2, l)
+        assert not any(isinstance(p, core._Indexable) for p in portions)
+        assert list(map(tuple, portions)) == [(10, 20),
+                                              (30,),
+                                              (40, 50)]
 
     def test_indices(self):
         assert list(indices(0)) == []
@@ -162,6 +260,13 @@ class TestYail(unittest.TestCase):
                                                                  (4, None),
                                                                  (5, None)]
 
+        assert list(pad([1,2,3], -1, 0)) == [1, 2, 3]
+        assert list(pad([1,2,3], -2, -2)) == [1, 2, 3]
+        assert list(pad(iter([1,2,3]), -2, -2)) == [1, 2, 3]
+        assert len(pad([1,2,3], -2, 1)) == 4
+        padded = pad(collections.deque([1,2,3]), -2, 1)
+        assert padded.__length_hint__() == 4
+
         padded = pad([1,2,3], before=None, after=None)
         assert list(zip(range(3), padded)) == [(0, None),
                                                (1, None),
@@ -223,6 +328,36 @@ class TestYail(unittest.TestCase):
                        (4, None, None)]
 
 
+    def test_sliding_window_blocks(self):
+        import numpy
+
+        assert list(sliding_window_blocks([], 3)) == []
+
+        data = numpy.arange(20)
+        for sizes in [[20], [5, 5, 5, 5], [1] * 20, [3, 0, 1, 7, 9]]:
+            ends = list(accumulate(lambda a, b: a + b, sizes))
+            blocks = numpy.split(data, ends[:-1])
+            for n in [1, 2, 3, 5]:
+                for pad_before, pad_after in itertools.product([False, True],
+                                                               repeat=2):
+                    result = sliding_window_blocks(
+                        iter(blocks), n, pad_before, pad_after, fillvalue=-1
+                    )
+                    result = [tuple(w) for b in result for w in b.tolist()]
+                    expected = list(sliding_window_filled(
+                        data.tolist(), n, pad_before, pad_after, fillvalue=-1
+                    ))
+                    assert result == expected
+
+        blocks = [numpy.arange(6).reshape(3, 2), numpy.arange(6, 10).reshape(2, 2)]
+        result = list(sliding_window_blocks(blocks, 2))
+        assert [b.shape for b in result] == [(2, 2, 2), (1, 2, 2), (1, 2, 2)]
+        assert result[1][0].tolist() == [[4, 5], [6, 7]]
+        assert all(not b.flags.writeable for b in result)
+        assert numpy.shares_memory(result[0], blocks[0])
+        assert numpy.shares_memory(result[2], blocks[1])
+
+
     def test_subrange(self):
         assert list(map(list, subrange(5))) == [[0], [1], [2], [3], [4]]
         assert list(map(list, subrange(0, 5))) == [[0], [1], [2], [3], [4]]
@@ -242,6 +377,239 @@ class TestYail(unittest.TestCase):
                                                          [6]]
 
 
+    def test_subrange_halo(self):
+        assert list(subrange(0, halo_before=1)) == []
+
+        result = list(subrange(0, 10, 3, halo_before=2, halo_after=1))
+        assert result == [(range(0, 3), range(0, 4)),
+                          (range(3, 6), range(1, 7)),
+                          (range(6, 9), range(4, 10)),
+                          (range(9, 10), range(7, 10))]
+
+        result = list(subrange(0, 10, 3, halo_before=0, halo_after=0))
+        assert result == [(r, r) for r in subrange(0, 10, 3)]
+
+        result = list(subrange(2, 8, 3, 2, halo_before=1, clamp=False))
+        assert result == [(range(2, 5, 2), range(1, 5)),
+                          (range(5, 8, 2), range(4, 8))]
+
+        data = list(range(10, 20))
+        stencil = []
+        for interior, read in subrange(0, 10, 4, halo_before=1, halo_after=1,
+                                       clamp=False):
+            lo = read.start - max(read.start, 0)
+            window = list(pad(data[max(read.start, 0):read.stop],
+                              before=-lo,
+                              after=max(read.stop - 10, 0),
+                              fill=0))
+            stencil.extend(sum(w) for w in sliding_window_filled(window, 3))
+        assert stencil == [sum(w) for w in sliding_window_filled(
+            data, 3, pad_before=True, pad_after=True, fillvalue=0
+        )][1:-1]
+
+        # Iterating gives the same ranges as looking each one up.
+        for kwargs in [{}, dict(halo_before=2, halo_after=3),
+                       dict(halo_after=1, clamp=False)]:
+            it = subrange(1, 30, 4, 3, **kwargs)
+            expected = [it[i] for i in range(len(it))]
+            assert list(copy.copy(it)) == expected
+            next(it)
+            assert list(it) == expected[1:]
+
+
+    def test_subrange_bounds(self):
+        assert subrange_bounds(0).tolist() == []
+        assert subrange_bounds(5, 5).tolist() == []
+
+        for args in [(5,), (0, 5), (1, 5), (0, 10, 3), (0, 7, 3), (2, 17, 4)]:
+            expected = [[r.start, r.stop] for r in subrange(*args)]
+            assert subrange_bounds(*args).tolist() == expected
+
+        bounds = subrange_bounds(0, 10**6, 7)
+        assert bounds.shape == (142858, 2)
+        assert bounds[-1].tolist() == [999999, 1000000]
+
+
+    def test_partition_range(self):
+        assert list(partition_range(0, 3)) == [range(0, 0)] * 3
+        assert list(map(list, partition_range(2, 3))) == [[0], [1], []]
+
+        for n in range(0, 40):
+            for k in range(1, 9):
+                chunks = partition_range(n, k)
+                assert len(chunks) == k
+                assert list(itertools.chain(*chunks)) == list(range(n))
+
+                sizes = list(map(len, chunks))
+                assert max(sizes) - min(sizes) <= 1
+                assert [chunks[i] for i in range(k)] == list(chunks)
+
+        chunks = partition_range(10, 4, start=3)
+        assert list(map(list, chunks)) == [[3, 4, 5], [6, 7, 8], [9, 10], [11, 12]]
+        assert chunks[-1] == range(11, 13)
+
+        with self.assertRaises(IndexError):
+            chunks[4]
+
+        chunks = partition_range(100, 3, multiple=8)
+        assert list(itertools.chain(*chunks)) == list(range(100))
+        assert all((r.start % 8) == 0 for r in chunks)
+
+        chunks = partition_range(10**12, 64)
+        assert chunks[63] == range(10**12 - 15625000000, 10**12)
+
+
+    def test_partition_plan(self):
+        plan = partition_plan(0, (2, 2))
+        assert len(plan) == 4
+        assert [r for _, r in plan] == [range(0, 0)] * 4
+
+        for n in [7, 64, 101]:
+            plan = partition_plan(n, (3, 4, 2), start=5)
+            assert len(plan) == 24
+
+            ids = [i for i, _ in plan]
+            assert ids == list(indices(3, 4, 2))
+
+            leaves = [r for _, r in plan]
+            assert list(itertools.chain(*leaves)) == list(range(5, n + 5))
+
+            sizes = list(map(len, leaves))
+            assert max(sizes) - min(sizes) <= 1
+
+            for i in range(3):
+                assert plan[i] == partition_range(n, 3, start=5)[i]
+                assert plan[i, 0].start == plan[i].start
+                assert plan[(i, 3, 1)].stop == plan[i].stop
+
+        plan = partition_plan(1000, (2, 4), multiples=(64, 8))
+        leaves = [r for _, r in plan]
+        assert list(itertools.chain(*leaves)) == list(range(1000))
+        assert all((r.start % 8) == 0 for r in leaves)
+        assert plan[1].start % 64 == 0
+
+        with self.assertRaises(IndexError):
+            plan[0, 0, 0]
+
+        with self.assertRaises(IndexError):
+            plan[2]
+
+
+    def test_partition_weighted(self):
+        assert partition_weighted([], 3) == [range(0, 0)] * 3
+        assert partition_weighted([1, 2, 3], 1) == [range(0, 3)]
+
+        assert partition_weighted([1] * 9, 3) == [range(0, 3),
+                                                  range(3, 6),
+                                                  range(6, 9)]
+
+        assert partition_weighted([50, 1, 1, 1, 1], 2) == [range(0, 1),
+                                                           range(1, 5)]
+
+        assert partition_weighted([1, 1, 1, 1, 50], 2) == [range(0, 4),
+                                                           range(4, 5)]
+
+        chunks = partition_weighted([0, 0, 0], 2, start=4, step=3)
+        assert list(itertools.chain(*chunks)) == list(range(4, 13))
+
+        chunks = partition_weighted([1] * 4, 2, start=1, step=4, stop=15)
+        assert chunks == [range(1, 9), range(9, 15)]
+
+        weights = [1 + (i % 50) for i in range(1000)]
+        chunks = partition_weighted(weights, 8)
+        assert list(itertools.chain(*chunks)) == list(range(1000))
+
+        costs = [sum(weights[r.start:r.stop]) for r in chunks]
+        assert max(costs) - min(costs) <= 2 * max(weights)
+
+
+    def test_parallel_map(self):
+        assert list(parallel_map(sum_range, 0, workers=1)) == []
+
+        expected = [sum(r) for r in subrange(0, 100, 7)]
+        assert list(parallel_map(sum_range, 0, 100, 7, workers=2)) == expected
+
+        result = parallel_map(sum_range, 0, 100, 7, workers=2, pending=1)
+        assert list(result) == expected
+
+        result = parallel_map(sum_range, 0, 100, 7, workers=3, ordered=False)
+        assert sorted(result) == sorted(expected)
+
+        result = parallel_map(sum_range, 0, 12, 3, 2, workers=2)
+        assert list(result) == [2, 8, 14, 20]
+
+        with self.assertRaises(ValueError):
+            list(parallel_map(fail_on_three, 0, 10, 1, workers=2))
+
+        with self.assertRaises(ValueError):
+            list(parallel_map(fail_on_three, 0, 10, workers=2, ordered=False))
+
+        result = parallel_map(sum_range, 0, 1000, 7, workers=2, target=0.01)
+        assert sum(result) == sum(range(1000))
+
+
+    def test_adaptive_subrange(self):
+        class Clock(object):
+            now = 0.0
+
+            def __call__(self):
+                return self.now
+
+        assert list(adaptive_subrange(0)) == []
+        assert list(map(list, adaptive_subrange(0, 12, 3, 2, factor=1))) == [
+            [0, 2], [3, 5], [6, 8], [9, 11]
+        ]
+
+        # Each element takes 1ms, so ranges should grow to 100 elements.
+        clock = Clock()
+        sizes = []
+        for r in adaptive_subrange(0, 10000, 10, target=0.1, timer=clock):
+            clock.now += 0.001 * len(r)
+            sizes.append(len(r))
+        assert sum(sizes) == 10000
+        assert sizes[:5] == [10, 20, 40, 80, 100]
+        assert set(sizes[4:-1]) == {100}
+
+        # Each element takes 1s, so ranges should shrink to 1 element.
+        clock = Clock()
+        sizes = []
+        for r in adaptive_subrange(0, 1000, 64, target=1.0, timer=clock):
+            clock.now += 1.0 * len(r)
+            sizes.append(len(r))
+        assert sum(sizes) == 1000
+        assert sizes[:8] == [64, 32, 16, 8, 4, 2, 1, 1]
+
+        # Ranges get smaller near the end when shared among workers.
+        clock = Clock()
+        sizes = []
+        for r in adaptive_subrange(0, 1000, 100, factor=1, workers=4, timer=clock):
+            clock.now += 0.001 * len(r)
+            sizes.append(len(r))
+        assert sum(sizes) == 1000
+        assert sizes[0] == 100
+        assert sizes[-1] == 1
+        assert sizes == sorted(sizes, reverse=True)
+
+        # Reported times are used instead of the consumer's, which is
+        # about 0 when ranges are handed to a pool.
+        it = adaptive_subrange(0, 10000, 100, target=1.0, timer=False)
+        handed = [next(it), next(it)]
+        assert list(map(len, handed)) == [100, 100]
+        it.record(handed[0], 2.0)
+        assert len(next(it)) == 50
+        it.record(handed[1], 0.5)
+        assert len(next(it)) == 200
+        assert len(it.send(0.5)) == 400
+        assert sum(map(len, it)) == 10000 - 850
+
+        # Once a time is reported, the consumer's time is not used.
+        clock = Clock()
+        it = adaptive_subrange(0, 10000, 100, target=1.0, timer=clock)
+        it.record(next(it), 1.0)
+        clock.now += 100.0
+        assert len(next(it)) == 100
+
+
     def test_disperse(self):
         assert list(disperse(iter(range(0)))) == []
 
@@ -261,6 +629,407 @@ class TestYail(unittest.TestCase):
         assert list(disperse(range(0, 10, 2))) == [0, 6, 8, 2, 4]
 
 
+    def test_disperse_iterator(self):
+        for n in range(40):
+            assert list(disperse(range(n))) == list(disperse(iter(range(n))))
+
+
+    def test_shard(self):
+        for world_size in [1, 2, 3, 7, 50]:
+            for rank in range(world_size):
+                for it, expected in zip(make_iterators(False),
+                                        make_iterators(False)):
+                    expected = list(itertools.islice(
+                        expected, rank, None, world_size
+                    ))
+                    assert list(shard(it, rank, world_size)) == expected
+
+        infinite = [
+            cycles([1, 2, 3], None),
+            pad([1, 2], after=None),
+            pad([1, 2], before=None),
+        ]
+        for it in infinite:
+            result = list(itertools.islice(shard(it, 1, 4), 5))
+            expected = list(itertools.islice(it, 1, 21, 4))
+            assert result == expected
+
+        it = indices(10**6, 10**6)
+        assert list(shard(it, 3, 10**11)) == [(i * 10**5, 3) for i in range(10)]
+
+        it = indices(4, 4)
+        next(it)
+        next(it)
+        assert list(shard(it, 0, 5)) == [(0, 2), (1, 3), (3, 0)]
+        assert next(it) == (0, 2)
+
+        assert list(shard(shard(range(20), 1, 2), 1, 3)) == [3, 9, 15]
+
+        with self.assertRaises(AssertionError):
+            shard(range(5), 3, 3)
+
+
+    def test_pickle(self):
+        for skip in [0, 1, 7]:
+            for it, expected in zip(make_iterators(), make_iterators()):
+                if isinstance(it, types.GeneratorType):
+                    continue
+
+                list(itertools.islice(it, skip))
+                list(itertools.islice(expected, skip))
+
+                for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                    it = pickle.loads(pickle.dumps(it, protocol))
+
+                assert (list(itertools.islice(it, 100)) ==
+                        list(itertools.islice(expected, 100)))
+
+        it = subrange(0, 10**12, 10**3)
+        next(it)
+        assert len(pickle.dumps(it, pickle.HIGHEST_PROTOCOL)) < 200
+        assert next(pickle.loads(pickle.dumps(it))) == range(1000, 2000)
+
+
+    def test_from_state(self):
+        for skip in [0, 1, 5, 100]:
+            for it, expected in zip(make_iterators(False),
+                                    make_iterators(False)):
+                if not hasattr(it, "state"):
+                    continue
+
+                consumed = len(list(itertools.islice(it, skip)))
+                list(itertools.islice(expected, skip))
+
+                state = pickle.loads(pickle.dumps(it.state()))
+                assert state[-1] == consumed
+                assert list(from_state(state)) == list(expected)
+
+        it = sliding_window_filled([1, 2, 3], 2, pad_before=True)
+        next(it)
+        assert it.state()[-1] == 1
+        assert list(from_state(it.state())) == [(1, 2), (2, 3)]
+        assert list(it) == [(1, 2), (2, 3)]
+        assert it.state()[-1] == 3
+
+        with self.assertRaises(TypeError):
+            from_state((int, (), 0))
+
+
+    def test_advance(self):
+        for skip in [0, 1, 2, 5, 13, 100]:
+            for it, expected in zip(make_iterators(False),
+                                    make_iterators(False)):
+                if isinstance(it, list):
+                    continue
+
+                list(itertools.islice(expected, skip))
+                assert advance(it, skip) is it
+                assert list(it) == list(expected)
+
+        it = indices(4, 5)
+        next(it)
+        it.advance(6)
+        assert next(it) == (1, 2)
+        advance(it, 0)
+        assert next(it) == (1, 3)
+        assert it.state()[-1] == 9
+
+        it = cycles(range(7), None)
+        advance(it, 10**18)
+        assert next(it) == (10**18) % 7
+
+        it = indices(10**6, 10**6, 10**6)
+        advance(it, 10**18 - 2)
+        assert list(it) == [(999999, 999999, 999998), (999999, 999999, 999999)]
+
+        with self.assertRaises(AssertionError):
+            advance(indices(3), -1)
+
+
+    def test_length_hint(self):
+        def hint(it):
+            return operator.length_hint(it, -1)
+
+        for make in [list, tuple, set, lambda r: r]:
+            def fresh():
+                return make(range(4))
+
+            for it_fn in [lambda: cycles(fresh(), 3),
+                          lambda: duplicate(fresh(), 2),
+                          lambda: pad(fresh(), 2, 3),
+                          lambda: sliding_window_filled(fresh(), 3),
+                          lambda: sliding_window_filled(fresh(), 3, True),
+                          lambda: sliding_window_filled(fresh(), 3, True, True),
+                          lambda: disperse(fresh())]:
+                it = it_fn()
+                length = len(list(it_fn()))
+                assert hint(it) == length
+                next(it)
+                assert hint(it) == length - 1
+                assert len(list(it)) == length - 1
+                assert hint(it) == 0
+
+            assert hint(sliding_window_filled(fresh(), 9)) == 0
+
+            pieces = split(1, fresh())
+            assert list(map(hint, pieces)) == [1, 1, 2]
+            assert list(map(len, map(list, pieces))) == [1, 1, 2]
+            assert list(map(hint, pieces)) == [0, 0, 0]
+
+            pieces = split(4, fresh())
+            assert list(map(hint, pieces)) == [4, 0, 0]
+
+        for it in [subrange(0, 10, 3), indices(3, 4), shard(range(10), 1, 3)]:
+            length = len(list(copy.copy(it)))
+            assert hint(it) == length
+            next(it)
+            assert hint(it) == length - 1
+
+        assert hint(cycles([1], None)) == -1
+        assert hint(pad([1], after=None)) == -1
+        assert hint(pad(iter([1]), 1, 1)) == -1
+        assert hint(cycles(iter([1]), 2)) == -1
+
+
+    def test_range_sequence(self):
+        n = 10**12
+        front, middle, back = split(10**9, range(n))
+        for it, expected in [(cycles(range(5), 3), list(range(5)) * 3),
+                             (duplicate(range(5), 2),
+                              list(duplicate(range(5), 2))),
+                             (pad(range(5), 2, 1, -1),
+                              [-1, -1, 0, 1, 2, 3, 4, -1]),
+                             (subrange(0, 20, 3), list(subrange(0, 20, 3))),
+                             (split(1, range(5))[2], [2, 3, 4])]:
+            assert len(it) == len(expected)
+            assert [it[i] for i in range(-len(it), len(it))] == 2 * expected
+            assert list(it[1:-1:2]) == expected[1:-1:2]
+            assert all(each in it for each in expected)
+            assert range(30, 40) not in it
+
+            with self.assertRaises(IndexError):
+                it[len(it)]
+
+            next(it)
+            assert len(it) == len(expected) - 1
+            assert it[0] == expected[1]
+            assert list(it[::2]) == expected[1::2]
+            assert list(it) == expected[1:]
+            assert len(it) == 0 and it
+
+        # Nothing is computed element by element.
+        # The first item is still to come again in the first three.
+        for it, again in [(cycles(range(n), 3), True),
+                          (duplicate(range(n), 2), True),
+                          (pad(range(n), 2, 3, -1), True),
+                          (front, False),
+                          (back, False)]:
+            assert len(it) >= 10**9
+            assert it[-1] in it
+            assert -2 not in it
+            first = next(it)
+            assert it[0] in it and it[-1] in it
+            assert (first in it) == again
+            assert len(it[1::10**8]) == -(-(len(it) - 1) // 10**8)
+            assert it[1::10**8][1] == it[1 + 10**8]
+        assert len(middle) == 1 and middle[0] == 10**9
+        assert len(subrange(0, n, 7)) == -(-n // 7)
+        assert range(7, 14) in subrange(0, n, 7)
+        assert range(7, 13) not in subrange(0, n, 7)
+        assert 0 not in subrange(0, n, 7)
+        assert (range(7, 14), range(6, 15)) in subrange(
+            0, n, 7, halo_before=1, halo_after=1
+        )
+
+        # Slices look up ``in`` where they were sliced from.
+        it = cycles(range(n), 2)
+        assert 0 not in it[1:n] and 0 in it[1:n + 1] and -5 not in it[1:]
+        it = duplicate(range(n), 3)
+        assert 0 not in it[3:] and 1 in it[3:4] and 2 not in it[3:4]
+        it = pad(range(n), 2, 2, -1)
+        assert -1 not in it[2:-2] and -1 in it[1:-2] and -1 in it[2:-1]
+        assert n - 1 not in it[:-3] and -1 not in it[1:][1:-2]
+        it = subrange(0, n, 7)
+        assert range(0, 7) not in it[1:] and range(7, 14) in it[1:]
+        it = shard(pad(range(n), 2, 2, -1), 0, 1)
+        assert -1 not in it[2:-2] and -1 in it[2:]
+        assert list(cycles([1, 2, 3], 2)[1:3]) == [2, 3]
+        assert 1 not in cycles([1, 2, 3], 2)[1:3]
+        assert 1 in cycles([1, 2, 3], 2)[2:4]
+        assert 3 not in duplicate([1, 2, 3], 2)[1:4]
+        assert 3 not in pad([1, 2, 3], 1, 1)[:-2]
+
+        # Only what is left counts, even past the first item.
+        it = pad(range(n), 2, 0, -1)
+        advance(it, 2)
+        assert -1 not in it and n - 1 in it
+        it = duplicate(range(n), 3)
+        advance(it, 4)
+        assert 0 not in it and 1 in it
+
+        # Infinite ones index and slice but have no ``len``.
+        it = cycles(range(3), None)
+        assert it[10**12] == 1 and 2 in it and 3 not in it
+        assert list(it[2:8:2]) == [2, 1, 0]
+        with self.assertRaises(TypeError):
+            len(it)
+        with self.assertRaises(AssertionError):
+            it[-1:]
+
+        # Checking ``in`` ends, even once iterating has begun.
+        next(it)
+        assert 0 in it and 3 not in it
+        it = shard(pad(range(10), 3, None, -1), 1, 4)
+        next(it)
+        assert 6 in it and -1 in it and 5 not in it
+
+
+    def test_sequence_contains(self):
+        # Strings are searched for items, not substrings.
+        assert "b" in cycles("abc", 2) and "ab" not in cycles("abc", 2)
+        assert "" not in duplicate("abc", 2)
+        assert "ab" not in pad("abc", 1, 1, "-")
+
+        # Array rows are compared whole.
+        import numpy
+
+        a = numpy.arange(6).reshape(3, 2)
+        it = pad(a, 1, 0, numpy.zeros(2, dtype=a.dtype))
+        assert numpy.array([0, 0]) in it
+        assert numpy.array([2, 3]) in it
+        assert numpy.array([0, 3]) not in it
+        assert numpy.array([[0, 1]]) not in cycles(a, 2)
+        assert 3 in duplicate(numpy.arange(5), 2)
+        assert 5 not in duplicate(numpy.arange(5), 2)
+
+
+    def test_reopen(self):
+        class Source(object):
+            def __init__(self, n):
+                self.n = n
+                self.opened = 0
+
+            def __call__(self):
+                self.opened += 1
+                return (i for i in range(self.n))
+
+        class Reiterable(Source):
+            def __iter__(self):
+                return self()
+
+        source = Source(4)
+        it = cycles(source, 3)
+        assert source.opened == 0
+        assert list(it) == 3 * [0, 1, 2, 3]
+        assert source.opened == 3
+
+        source = Reiterable(4)
+        assert list(cycles(source, 2)) == 2 * [0, 1, 2, 3]
+        assert source.opened == 2
+        assert list(itertools.islice(cycles(source, None), 10)) == [
+            0, 1, 2, 3, 0, 1, 2, 3, 0, 1
+        ]
+
+        for source in [Source(5), Reiterable(5)]:
+            front, middle, back = split(2, source)
+            assert source.opened == 0
+            assert list(back) == [3, 4]
+            assert list(middle) == [2]
+            assert list(front) == [0, 1]
+            assert source.opened == 3
+
+        for n in [0, 1, 2, 10, 37]:
+            for batch in [1, 3, 1024]:
+                source = Source(n)
+                result = list(disperse(source, batch=batch))
+                assert result == list(disperse(range(n)))
+                assert source.opened == 1 + -(-n // batch)
+
+        # By default, each pass fills what room there is in the budget.
+        source = Source(20)
+        with buffering.Budget(8) as budget:
+            budget.acquire("other", 1)
+            assert list(disperse(source)) == list(disperse(range(20)))
+        assert source.opened == 1 + 3
+        assert (budget.used, budget.peak) == (1, 8)
+
+        # The budget is the one active when ``disperse`` is called.
+        with buffering.Budget(8) as budget:
+            result = disperse(Source(20))
+        assert list(result) == list(disperse(range(20)))
+        assert (budget.used, budget.peak) == (0, 8)
+
+        # Batches larger than the budget follow its policy.
+        with buffering.Budget(8) as budget:
+            budget.acquire("other", 1)
+            with self.assertRaises(buffering.BudgetExceeded):
+                list(disperse(Source(20), batch=10))
+        with buffering.Budget(8, "spill") as budget:
+            budget.acquire("other", 1)
+            assert list(disperse(Source(20), batch=10)) == list(
+                disperse(range(20))
+            )
+        assert (budget.used, budget.peak) == (1, 11)
+
+
+    @unittest.skipIf(tracemalloc is None, "requires tracemalloc")
+    def test_memory_split(self):
+        # Only the pieces not yet read are buffered.
+        for n in [10, 1000]:
+            it = (i for i in range(10**5))
+            peak = traced_peak(lambda: [drain(p) for p in split(n, it)])
+            assert peak < 16 * 1024 + 100 * n
+
+            it = (i for i in range(10**5))
+            peak = traced_peak(
+                lambda: [drain(p) for p in split(n, it)[:2]]
+            )
+            assert peak < 16 * 1024 + 100 * n
+
+
+    @unittest.skipIf(tracemalloc is None, "requires tracemalloc")
+    def test_memory_cycles(self):
+        for seq in [list(range(10**5)), range(10**5)]:
+            peak = traced_peak(lambda: drain(cycles(seq, 3)))
+            assert peak < 16 * 1024
+
+        def fresh():
+            return iter(range(10**4))
+
+        peak = traced_peak(lambda: drain(cycles(fresh, 3)))
+        assert peak < 16 * 1024
+
+
+    @unittest.skipIf(tracemalloc is None, "requires tracemalloc")
+    def test_memory_disperse(self):
+        for seq in [list(range(10**4)), range(10**4)]:
+            peak = traced_peak(lambda: drain(disperse(seq)))
+            assert peak < 16 * 1024
+
+        # Reopening ``seq`` holds a batch at a time, however long it is.
+        for n in [1000, 8000]:
+            peak = traced_peak(
+                lambda: drain(disperse(lambda: iter(range(n)), batch=64))
+            )
+            assert peak < 16 * 1024 + 500 * 64
+
+
+    @unittest.skipIf(tracemalloc is None, "requires tracemalloc")
+    def test_memory_sliding_window_filled(self):
+        for n in [3, 300]:
+            it = (i for i in range(10**5))
+            peak = traced_peak(lambda: drain(sliding_window_filled(it, n)))
+            assert peak < 16 * 1024 + 200 * n
+
+            for make in [lambda: (i for i in range(10**5)),
+                         lambda: list(range(10**5))]:
+                seq = make()
+                peak = traced_peak(
+                    lambda: drain(sliding_window_filled(seq, n, True, True))
+                )
+                assert peak < 16 * 1024 + 200 * n
+
+
     def tearDown(self):
         pass
 
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 14:05$"
+
+
+import doctest
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import yail.core
+
+from yail import instrumentation
+
+from yail.instrumentation import (
+    FileSink,
+    Histogram,
+    LoggingSink,
+    Registry,
+    StageStats,
+    disable_profiling,
+    enable_profiling,
+    is_profiling,
+    profiles,
+    reset_profiles,
+    set_sink,
+)
+
+from yail.core import (
+    duplicate,
+    generator,
+    pad,
+    sliding_window_filled,
+)
+
+from builtins import (
+    range,
+)
+
+
+# Load doctests from `instrumentation`.
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(instrumentation))
+    return tests
+
+
+def slow(it, delay):
+    for each in it:
+        time.sleep(delay)
+        yield each
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+
+    def test_stage_stats(self):
+        stats = StageStats("stage")
+        assert stats.throughput == 0.0
+
+        stats.items = 10
+        stats.elapsed = 2.0
+        assert stats.throughput == 5.0
+        assert list(stats.as_dict()) == [
+            "name", "items", "produce_time", "consume_time", "elapsed",
+            "throughput"
+        ]
+
+
+    def test_generator(self):
+        registry = Registry()
+
+        it = generator(slow(range(5), 0.01), name="slow", sink=registry)
+        assert len(registry) == 0
+        assert list(it) == list(range(5))
+
+        stats, = registry["slow"]
+        assert stats.items == 5
+        assert stats.produce_time >= 0.05
+        assert stats.consume_time < stats.produce_time
+        assert stats.elapsed >= stats.produce_time
+        assert stats.throughput > 0
+
+
+    def test_generator_closed(self):
+        registry = Registry()
+
+        it = generator(range(10), name="early", sink=registry)
+        assert list(itertools.islice(it, 3)) == [0, 1, 2]
+        it.close()
+
+        stats, = registry["early"]
+        assert stats.items == 3
+
+
+    def test_pipeline(self):
+        registry = Registry()
+
+        it = generator(range(20), name="source", sink=registry)
+        it = generator(pad(it, before=1, after=1), name="pad", sink=registry)
+        it = generator(
+            sliding_window_filled(it, 3), name="window", sink=registry
+        )
+        it = generator(
+            duplicate(slow(it, 0.005), 2), name="duplicate", sink=registry
+        )
+        assert len(list(it)) == 40
+
+        assert list(registry) == ["source", "pad", "window", "duplicate"]
+        assert registry["duplicate"][0].items == 40
+        assert registry["window"][0].items == 20
+        assert (
+            registry["duplicate"][0].produce_time >
+            registry["window"][0].produce_time
+        )
+
+        registry.clear()
+        assert len(registry) == 0
+
+
+    def test_default_sink(self):
+        registry = Registry()
+
+        old_sink = set_sink(registry)
+        try:
+            assert list(generator(range(3), name="default")) == [0, 1, 2]
+        finally:
+            assert set_sink(old_sink) is registry
+
+        assert registry["default"][0].items == 3
+
+
+    def test_logging_sink(self):
+        logger = logging.getLogger("yail.test")
+        with self.assertLogs(logger, logging.DEBUG) as logs:
+            sink = LoggingSink(logger, logging.DEBUG)
+            list(generator(range(3), name="logged", sink=sink))
+
+        assert len(logs.output) == 1
+        assert logs.output[0].startswith("DEBUG:yail.test:logged: 3 items")
+
+
+    def test_file_sink(self):
+        path = os.path.join(self.temp_dir, "stats.jsonl")
+        sink = FileSink(path)
+
+        list(generator(range(3), name="first", sink=sink))
+        list(generator(range(4), name="second", sink=sink))
+
+        with open(path) as f:
+            records = [json.loads(each) for each in f]
+
+        assert [(r["name"], r["items"]) for r in records] == [
+            ("first", 3), ("second", 4)
+        ]
+
+
+    def test_histogram(self):
+        h = Histogram()
+        assert h.percentile(50) == 0.0
+
+        h.add(0.0)
+        assert h.percentile(99) == 1e-9
+
+        for each in [1e-3] * 98 + [1.0]:
+            h.add(each)
+        assert h.count == 100
+        assert 1e-3 <= h.percentile(50) < 1.2e-3
+        assert 1e-3 <= h.percentile(99) < 1.2e-3
+        assert 1.0 <= h.percentile(100) < 1.2
+
+        with self.assertRaises(AssertionError):
+            h.percentile(101)
+
+
+    def test_profiling(self):
+        original = yail.core.split
+        assert not is_profiling()
+
+        enable_profiling()
+        try:
+            enable_profiling()
+            assert is_profiling()
+            assert yail.core.split is not original
+            assert yail.core.split.__wrapped__ is original
+
+            front, middle, back = yail.core.split(2, iter(range(10)))
+            assert list(back) == list(range(3, 10))
+
+            it = yail.core.sliding_window_filled(range(6), 3)
+            assert yail.core.advance(it, 1) is it
+            assert list(it) == [(1, 2, 3), (2, 3, 4), (3, 4, 5)]
+            assert it.state()[-1] == 4
+
+            it = yail.core.pad(iter(range(4)), 1, 1)
+            it = yail.core.duplicate(it, 2)
+            assert len(list(it)) == 12
+        finally:
+            disable_profiling()
+
+        assert not is_profiling()
+        assert yail.core.split is original
+        assert list(yail.core.duplicate(range(3), 2)) == [0, 0, 1, 1, 2, 2]
+
+        result = profiles()
+        assert "split" in result
+        assert "cycles" not in result
+
+        assert result["duplicate"].calls == 1
+        assert result["duplicate"].elements == 12
+        assert result["pad"].elements == 0
+        assert result["advance"].calls == 1
+        assert result["sliding_window_filled"].elements == 3
+
+        summary = result["sliding_window_filled"].as_dict()
+        assert summary["calls"] == 1
+        assert summary["call_p99"] >= summary["call_p50"] > 0
+        assert summary["element_p99"] >= summary["element_p50"] > 0
+
+        reset_profiles()
+        assert profiles() == {}
+
+
+    def test_profiling_lookups(self):
+        enable_profiling()
+        try:
+            it = yail.core.cycles(range(3), 2)
+            assert len(it) == 6
+            assert it[4] == 1
+            assert list(it[1:3]) == [1, 2]
+            assert 2 in it and 5 not in it
+            assert list(it) == [0, 1, 2, 0, 1, 2]
+
+            it = yail.core.split(2, range(10))[2]
+            next(it)
+            assert len(it) == 6 and 3 not in it and 9 in it
+        finally:
+            disable_profiling()
+            reset_profiles()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 19:40$"
+
+
+import doctest
+import itertools
+import random
+import sys
+import types
+import unittest
+
+from yail import core
+from yail import stream
+
+from yail.stream import (
+    Stream,
+)
+
+from yail.core import (
+    cycles,
+    disperse,
+    duplicate,
+    pad,
+    sliding_window_filled,
+    subrange,
+)
+
+from builtins import (
+    map,
+    range,
+)
+
+
+# Load doctests from `stream`.
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(stream))
+    return tests
+
+
+def is_odd(x):
+    return hash(x) % 2
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        pass
+
+
+    def test_stream(self):
+        s = Stream(range(5))
+        assert list(s) == list(range(5))
+
+        t = s.duplicate(2)
+        assert s.stages == ()
+        assert len(t.stages) == 1
+        assert list(t) == list(duplicate(range(5), 2))
+        assert list(t) == list(duplicate(range(5), 2))
+
+        assert repr(s.pad(1).map(str)) == (
+            "Stream(range(0, 5)).pad(1, 0, None).map(<class 'str'>)"
+        )
+
+        # Iterating skips the Python-level ``__next__`` of the result.
+        t = s.pad(1, 1, 0)
+        assert isinstance(t.iterator(), core._Pad)
+        assert not isinstance(iter(t), core._Positional)
+        assert list(iter(t)) == [0, 0, 1, 2, 3, 4, 0]
+
+        assert list(s.filter(None)) == list(filter(None, range(5)))
+        assert list(s.map(str).filter(None).duplicate(2)) == list(
+            duplicate(filter(None, map(str, range(5))), 2)
+        )
+
+
+    def test_fused(self):
+        # Same as nesting the yail calls.
+        stages = [
+            ("map", lambda it: map(str, it), lambda s: s.map(str)),
+            ("filter", lambda it: filter(is_odd, it),
+             lambda s: s.filter(is_odd)),
+            ("duplicate", lambda it: duplicate(it, 2),
+             lambda s: s.duplicate(2)),
+            ("duplicate", lambda it: duplicate(it, 0),
+             lambda s: s.duplicate(0)),
+            ("duplicate", lambda it: duplicate(it, 7),
+             lambda s: s.duplicate(7)),
+            ("pad", lambda it: pad(it, 2, 1, "x"),
+             lambda s: s.pad(2, 1, "x")),
+            ("window", lambda it: sliding_window_filled(it, 3, True),
+             lambda s: s.window(3, True)),
+            ("cycles", lambda it: cycles(it, 2), lambda s: s.cycles(2)),
+            ("disperse", lambda it: disperse(it), lambda s: s.disperse()),
+        ]
+
+        rand = random.Random(0)
+        for i in range(300):
+            chosen = [rand.choice(stages) for j in range(rand.randint(1, 5))]
+
+            for make in [lambda: range(12), lambda: iter(range(12))]:
+                expected = make()
+                actual = Stream(make())
+                for name, nested, chained in chosen:
+                    expected = nested(expected)
+                    actual = chained(actual)
+
+                assert list(actual) == list(expected), [
+                    c[0] for c in chosen
+                ]
+
+
+    def test_unroll(self):
+        for n in range(7):
+            s = Stream(range(4)).map(abs).duplicate(n)
+            assert list(s) == list(duplicate(range(4), n))
+
+            s = Stream(range(4)).duplicate(n).duplicate(2)
+            assert list(s) == list(duplicate(duplicate(range(4), n), 2))
+
+
+    def test_compiled(self):
+        stream._compiled.clear()
+
+        list(Stream(range(3)).map(str).duplicate(5))
+        list(Stream(range(5)).map(repr).duplicate(6))
+        assert len(stream._compiled) == 1
+
+        list(Stream(range(5)).map(repr).duplicate(2))
+        assert len(stream._compiled) == 2
+
+
+    def test_infinite(self):
+        s = Stream(range(3)).pad(after=None, fill=0).duplicate(2)
+        assert list(itertools.islice(s, 10)) == [0, 0, 1, 1, 2, 2, 0, 0, 0, 0]
+
+        s = Stream(range(3)).cycles(None).filter(bool).map(str)
+        assert list(itertools.islice(s, 5)) == ["1", "2", "1", "2", "1"]
+
+
+    def test_source_fast_path(self):
+        # Leading stages get the source itself, so it is not buffered.
+        it = iter(Stream(range(10**12)).cycles(2).duplicate(2))
+        assert list(itertools.islice(it, 4)) == [0, 0, 1, 1]
+
+        it = Stream(range(10**12)).window(2).iterator()
+        assert it.__length_hint__() == 10**12 - 1
+
+
+    def test_optimize(self):
+        s = Stream(range(3))
+        assert s.duplicate(1).cycles(1).pad().optimize().stages == ()
+        assert s.duplicate(2).duplicate(3).optimize().stages == (
+            ("duplicate", (6,)),
+        )
+        assert s.cycles(2).cycles(None).optimize().stages == (
+            ("cycles", (None,)),
+        )
+        assert s.cycles(None).cycles(0).optimize().stages == (
+            ("cycles", (0,)),
+        )
+        assert s.pad(1, None, 0).pad(2, 3, 0).optimize().stages == (
+            ("pad", (3, None, 0)),
+        )
+        assert len(s.pad(1, 1, 0).pad(1, 1, 1).optimize().stages) == 2
+
+        for t in [s.pad(1, None, 0).pad(2, 3, 0),
+                  s.pad(None, 1, 0).pad(2, 3, 0),
+                  s.cycles(2).cycles(None)]:
+            u = t.optimize()
+            assert u.stages != t.stages
+            assert (
+                list(itertools.islice(t, 20)) ==
+                list(itertools.islice(u, 20))
+            )
+
+
+    def test_closed_form(self):
+        # Sized chains are computed from positions, not buffered.
+        it = Stream(list(range(10**6))).duplicate(3).cycles(2).iterator()
+        assert isinstance(it, core._Cycles)
+        assert it.__length_hint__() == 6 * 10**6
+        it.advance(3 * 10**6 + 4)
+        assert next(it) == 1
+
+        # Membership looks up positions in the composed stages.
+        it = Stream(range(10**6)).duplicate(2).cycles(2).iterator()
+        it.advance(2 * 10**6 + 5)
+        assert -1 not in it
+        assert 1 not in it
+        assert 2 in it
+        assert 10**6 - 1 in it
+
+        expected = cycles(duplicate(list(range(5)), 3), 2)
+        assert list(Stream(list(range(5))).duplicate(3).cycles(2)) == (
+            list(expected)
+        )
+
+        pieces = Stream(range(10**9)).pad(2, 2, -1).split(10**9)
+        assert all(isinstance(p.source, core._Strided) for p in pieces)
+        assert list(pieces[1]) == [10**9 - 2]
+        assert list(pieces[2]) == [10**9 - 1, -1, -1]
+
+        source = subrange(0, 100, 7)
+        it = Stream(source).window(3, True).iterator()
+        assert isinstance(it, core._SlidingWindow)
+        assert list(it) == list(
+            sliding_window_filled(subrange(0, 100, 7), 3, True)
+        )
+        assert next(source) == range(0, 7)
+
+        it = Stream(range(10**6)).duplicate(2).disperse().iterator()
+        assert isinstance(it, core._Disperse)
+        it.advance(10**6)
+        expected = disperse(list(duplicate(range(10**6), 2)))
+        expected.advance(10**6)
+        assert next(it) == next(expected)
+        assert list(Stream(range(20)).duplicate(2).disperse()) == list(
+            disperse(list(duplicate(range(20), 2)))
+        )
+
+        # Without a later positional stage, ``duplicate`` is fused.
+        it = iter(Stream(range(5)).duplicate(2).map(str))
+        assert isinstance(it, types.GeneratorType)
+
+
+    def tearDown(self):
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(unittest.main())
@@ -0,0 +1,172 @@
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 17:20$"
+
+
+import argparse
+import json
+import platform
+import sys
+
+from . import __version__
+from . import benchmarks
+
+
+def _csv(convert=str):
+    def parse(value):
+        return [convert(each) for each in value.split(",") if each]
+
+    return parse
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def _print_comparison(rows, out):
+    out.write("%-24s %-10s %12s %8s %8s\n" % (
+        "name", "kind", "size", "speed", "memory"
+    ))
+    for row in rows:
+        memory = "-"
+        if row["memory"] is not None:
+            memory = "%.2fx" % row["memory"]
+
+        out.write("%-24s %-10s %12d %7.2fx %8s%s\n" % (
+            row["name"], row["kind"], row["size"], row["speed"], memory,
+            "  REGRESSED" if row["regressed"] else ""
+        ))
+
+
+def _compare(old, new, args, out):
+    rows = benchmarks.compare(
+        old, new, args.threshold, args.memory_threshold
+    )
+    _print_comparison(rows, out)
+
+    return int(any(row["regressed"] for row in rows))
+
+
+def bench(args):
+    """ Runs the benchmarks and writes their results as JSON. """
+
+    results = []
+    for result in benchmarks.run(args.names, args.kinds, args.sizes,
+                                 args.repeat):
+        sys.stderr.write("%-24s %-10s %12d %12.1f ns/element\n" % (
+            result["name"], result["kind"], result["size"],
+            result["ns_per_element"]
+        ))
+        results.append(result)
+
+    report = {
+        "yail": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "peak_rss": benchmarks.peak_rss(),
+        "results": results,
+    }
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare is not None:
+        # Keep stdout for the results if they are written there.
+        out = sys.stderr if args.output is None else sys.stdout
+        return _compare(_load(args.compare), results, args, out)
+
+    return 0
+
+
+def compare(args):
+    """ Compares two JSON result files from ``bench``. """
+
+    return _compare(_load(args.old), _load(args.new), args, sys.stdout)
+
+
+def _add_thresholds(parser):
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="fraction slower that counts as a regression (default: 0.1)"
+    )
+    parser.add_argument(
+        "--memory-threshold", type=float, default=None,
+        help="fraction more tracemalloc peak that counts as a regression"
+    )
+
+
+def main(argv=None):
+    """ Runs ``python -m yail``.
+
+    Args:
+
+        argv(list):              Arguments (``sys.argv[1:]`` by default).
+
+    Returns:
+
+        int:                     Exit status (1 if anything regressed).
+    """
+
+    parser = argparse.ArgumentParser(prog="python -m yail")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    bench_parser = commands.add_parser(
+        "bench", help="run the benchmarks and write JSON results"
+    )
+    bench_parser.add_argument(
+        "--names", type=_csv(), default=None,
+        help="comma separated benchmarks to run (default: all)"
+    )
+    bench_parser.add_argument(
+        "--kinds", type=_csv(), default=None,
+        help="comma separated input kinds (default: all)"
+    )
+    bench_parser.add_argument(
+        "--sizes", type=_csv(int), default=[10 ** e for e in range(2, 7)],
+        help="comma separated input sizes (default: 10^2 to 10^6)"
+    )
+    bench_parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="timed runs of each benchmark (default: 3)"
+    )
+    bench_parser.add_argument(
+        "-o", "--output", default=None,
+        help="file to write results to (default: stdout)"
+    )
+    bench_parser.add_argument(
+        "--compare", default=None, metavar="BASELINE",
+        help="results file to compare against"
+    )
+    _add_thresholds(bench_parser)
+    bench_parser.set_defaults(func=bench)
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare two results files"
+    )
+    compare_parser.add_argument("old", help="results to compare against")
+    compare_parser.add_argument("new", help="results to compare")
+    _add_thresholds(compare_parser)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        unknown = (
+            (set(args.names or []) - set(benchmarks.BENCHMARKS)) |
+            (set(args.kinds or []) - set(benchmarks.KINDS))
+        )
+        if unknown:
+            parser.error("unknown names or kinds: " + ", ".join(
+                sorted(unknown)
+            ))
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 16:30$"
+
+
+import collections
+import gc
+import itertools
+import sys
+import timeit
+
+from . import core
+
+from builtins import (
+    range,
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+KINDS = ("list", "range", "generator", "ndarray")
+SIZES = tuple(10 ** e for e in range(2, 9))
+
+
+def make_input(kind, size):
+    """ Makes an input of ``size`` items of the given kind.
+
+    Args:
+
+        kind(str):               One of ``KINDS``.
+        size(int):               Number of items.
+
+    Returns:
+
+        iterable:                The input.
+
+    Examples:
+
+        >>> make_input("list", 3)
+        [0, 1, 2]
+
+        >>> list(make_input("generator", 3))
+        [0, 1, 2]
+    """
+
+    assert (kind in KINDS), (
+        "kind must be one of " + repr(KINDS) + ", but got kind = " +
+        repr(kind)
+    )
+
+    if kind == "list":
+        return list(range(size))
+    elif kind == "range":
+        return range(size)
+    elif kind == "generator":
+        return (i for i in range(size))
+    else:
+        import numpy
+        return numpy.arange(size)
+
+
+def _split(seq, size):
+    return itertools.chain.from_iterable(core.split(size // 4, seq))
+
+
+# Each benchmark takes an input and its size and returns an iterator to
+# drain. Those that do not take an input are run on sizes alone.
+BENCHMARKS = collections.OrderedDict([
+    ("generator", lambda seq, size: core.generator(seq)),
+    ("cycles", lambda seq, size: core.cycles(seq, 2)),
+    ("duplicate", lambda seq, size: core.duplicate(seq, 2)),
+    ("split", _split),
+    ("indices", lambda seq, size: core.indices(size)),
+    ("pad", lambda seq, size: core.pad(seq, 16, 16)),
+    ("sliding_window_filled",
+     lambda seq, size: core.sliding_window_filled(seq, 3)),
+    ("subrange", lambda seq, size: core.subrange(0, size, 64)),
+    ("disperse", lambda seq, size: core.disperse(seq)),
+])
+
+SIZE_ONLY = frozenset(["indices", "subrange"])
+
+
+def _drain(it):
+    collections.deque(it, maxlen=0)
+
+
+def peak_rss():
+    """ Most memory the process has had resident (``None`` if unknown).
+
+    This covers the process's whole lifetime, so it is reported once
+    per run rather than for each benchmark.
+
+    Returns:
+
+        int:                     Peak resident set size in bytes.
+    """
+
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+
+    return rss
+
+
+def _traced_peak(func):
+    """ Peak bytes allocated while calling ``func`` (``None`` if unknown).
+    """
+
+    if tracemalloc is None:
+        return None
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        return None
+
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def run_benchmark(name, kind, size, repeat=3):
+    """ Times one benchmark and measures its peak memory.
+
+    The input is made before anything is measured, so only what the
+    benchmarked function itself allocates is counted. Throughput is
+    from the fastest of ``repeat`` runs. Peak memory is from one more
+    run under ``tracemalloc`` (``None`` where it is not available).
+
+    Args:
+
+        name(str):               One of ``BENCHMARKS``.
+        kind(str):               One of ``KINDS``.
+        size(int):               Number of items in the input.
+        repeat(int):             Number of timed runs.
+
+    Returns:
+
+        OrderedDict:             ``name``, ``kind``, ``size``,
+                                 ``seconds``, ``ops_per_sec`` (input
+                                 items per second), ``ns_per_element``
+                                 and ``tracemalloc_peak`` (bytes).
+
+    Examples:
+
+        >>> result = run_benchmark("duplicate", "list", 100)
+        >>> (result["name"], result["kind"], result["size"])
+        ('duplicate', 'list', 100)
+        >>> result["ops_per_sec"] > 0
+        True
+    """
+
+    assert (repeat > 0), (
+        "repeat must be greater than 0, but got repeat = " + repr(repeat)
+    )
+
+    bench = BENCHMARKS[name]
+    clock = timeit.default_timer
+
+    seconds = float("inf")
+    for i in range(repeat):
+        seq = make_input(kind, size)
+        gc.collect()
+
+        start = clock()
+        _drain(bench(seq, size))
+        seconds = min(seconds, clock() - start)
+
+    seq = make_input(kind, size)
+    gc.collect()
+    peak = _traced_peak(lambda: _drain(bench(seq, size)))
+
+    seconds = max(seconds, 1e-9)
+
+    return collections.OrderedDict([
+        ("name", name),
+        ("kind", kind),
+        ("size", size),
+        ("seconds", seconds),
+        ("ops_per_sec", size / seconds),
+        ("ns_per_element", 1e9 * seconds / max(size, 1)),
+        ("tracemalloc_peak", peak),
+    ])
+
+
+def run(names=None, kinds=None, sizes=None, repeat=3):
+    """ Runs benchmarks over every combination asked for.
+
+    Benchmarks that do not take an input (``SIZE_ONLY``) are run once
+    per size with ``kind`` set to ``None``. Without NumPy, ``ndarray``
+    inputs are skipped.
+
+    Args:
+
+        names(list):             Benchmarks to run (all by default).
+        kinds(list):             Input kinds to use (all by default).
+        sizes(list):             Input sizes to use (``SIZES`` by
+                                 default, which goes up to 10^8).
+        repeat(int):             Number of timed runs of each.
+
+    Returns:
+
+        generator:               The result of each benchmark as it is
+                                 run (see ``run_benchmark``).
+
+    Examples:
+
+        >>> results = list(run(["pad", "subrange"], ["list", "range"], [100]))
+        >>> [(r["name"], r["kind"]) for r in results]
+        [('pad', 'list'), ('pad', 'range'), ('subrange', None)]
+    """
+
+    if names is None:
+        names = list(BENCHMARKS)
+    if kinds is None:
+        kinds = list(KINDS)
+    if sizes is None:
+        sizes = list(SIZES)
+
+    if "ndarray" in kinds:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            kinds = [k for k in kinds if k != "ndarray"]
+
+    for name in names:
+        for size in sizes:
+            if name in SIZE_ONLY:
+                result = run_benchmark(name, "range", size, repeat)
+                result["kind"] = None
+                yield result
+                continue
+
+            for kind in kinds:
+                yield run_benchmark(name, kind, size, repeat)
+
+
+def compare(old, new, threshold=0.1, memory_threshold=None):
+    """ Compares two sets of benchmark results.
+
+    Results are matched on ``name``, ``kind`` and ``size``. Those only
+    in one set are left out.
+
+    Args:
+
+        old(list):               Results to compare against.
+        new(list):               Results to compare.
+        threshold(float):        How much slower (as a fraction) counts
+                                 as a regression.
+        memory_threshold(float): How much more ``tracemalloc_peak`` (as
+                                 a fraction) counts as a regression
+                                 (``None`` to not check).
+
+    Returns:
+
+        list:                    An ``OrderedDict`` for each match with
+                                 ``name``, ``kind``, ``size``, ``speed``
+                                 (old over new ``ns_per_element``),
+                                 ``memory`` (new over old
+                                 ``tracemalloc_peak``) and
+                                 ``regressed``.
+
+    Examples:
+
+        >>> old = [{"name": "pad", "kind": "list", "size": 100,
+        ...         "ns_per_element": 10.0, "tracemalloc_peak": 100}]
+        >>> new = [{"name": "pad", "kind": "list", "size": 100,
+        ...         "ns_per_element": 20.0, "tracemalloc_peak": 100}]
+        >>> row, = compare(old, new)
+        >>> (row["speed"], row["memory"], row["regressed"])
+        (0.5, 1.0, True)
+    """
+
+    def key(result):
+        return (result["name"], result["kind"], result["size"])
+
+    old = collections.OrderedDict((key(r), r) for r in old)
+
+    rows = []
+    for each_new in new:
+        each_old = old.get(key(each_new))
+        if each_old is None:
+            continue
+
+        speed = each_old["ns_per_element"] / each_new["ns_per_element"]
+
+        memory = None
+        if each_old.get("tracemalloc_peak") and (
+                each_new.get("tracemalloc_peak") is not None):
+            memory = (
+                float(each_new["tracemalloc_peak"]) /
+                each_old["tracemalloc_peak"]
+            )
+
+        regressed = speed < 1.0 / (1.0 + threshold)
+        if memory_threshold is not None and memory is not None:
+            regressed = regressed or memory > 1.0 + memory_threshold
+
+        rows.append(collections.OrderedDict([
+            ("name", each_new["name"]),
+            ("kind", each_new["kind"]),
+            ("size", each_new["size"]),
+            ("speed", speed),
+            ("memory", memory),
+            ("regressed", regressed),
+        ]))
+
+    return rows
@@ -0,0 +1,761 @@
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 10:12$"
+
+
+import array
+import collections
+import contextlib
+import itertools
+import mmap
+import pickle
+import tempfile
+import threading
+import weakref
+
+import toolz.itertoolz
+
+from builtins import (
+    range,
+)
+
+
+_options = {
+    "spill_limit": None,
+    "budget": None,
+    "metrics": None,
+}
+
+# Options set by ``with`` blocks, which only apply to their thread.
+_scoped = threading.local()
+
+# Typecode for spill file offsets (Python 2 has no ``"q"``).
+try:
+    array.array("q")
+    _offset_type = "q"
+except ValueError:
+    _offset_type = "l"
+
+
+def _option(name):
+    """ Gets the option in effect in this thread. """
+
+    stack = getattr(_scoped, name, None)
+    if stack:
+        return stack[-1]
+
+    return _options[name]
+
+
+def _push(name, value):
+    """ Sets an option for this thread until the matching ``_pop``. """
+
+    _scoped.__dict__.setdefault(name, []).append(value)
+
+
+def _pop(name):
+    _scoped.__dict__[name].pop()
+
+
+class BudgetExceeded(MemoryError):
+    """ Raised when a buffer would go over the memory budget. """
+
+
+class Budget(object):
+    """ Memory budget shared by yail's buffers.
+
+    Every buffering construct in yail (the tees in ``split``,
+    ``cycles`` and ``disperse`` and the windows of
+    ``sliding_window_filled``) charges what it holds in memory to the
+    active budget, under its own name in ``usage``. When a buffer
+    would go over the ``limit``, ``policy`` decides what happens.
+
+    * ``"raise"``: raise ``BudgetExceeded``.
+    * ``"spill"``: tees pickle the item to a temporary file instead
+      (windows are small and always kept in memory).
+    * ``"block"``: wait for another thread to free some of the budget.
+      If nothing is freed for ``timeout`` seconds (e.g. a single thread
+      reading ahead of branches only it could read), raise
+      ``BudgetExceeded``.
+
+    By default, each item counts as 1. With ``sizeof`` (e.g.
+    ``sys.getsizeof``), each item counts as its size instead.
+
+    Use it in a ``with`` block to apply it to that thread until the
+    block ends or pass it to ``set_budget`` to apply it process-wide.
+
+    Args:
+
+        limit(int):              Most that can be held in memory.
+        policy(str):             What to do when over the limit.
+        sizeof(callable):        Size of each item.
+        timeout(float):          Seconds to block without any of the
+                                 budget being freed before raising
+                                 (``None`` to wait forever).
+
+    Examples:
+
+        >>> from yail.core import split
+        >>> with Budget(100, "spill") as budget:
+        ...     front, middle, back = split(10, iter(range(20)))
+        ...     front = list(front)
+        ...     (budget.used, dict(budget.usage))
+        (10, {'split': 10})
+    """
+
+    def __init__(self, limit, policy="raise", sizeof=None, timeout=10.0):
+        assert (limit > 0), (
+            "limit must be greater than 0, but got limit = " + repr(limit)
+        )
+        assert (timeout is None or timeout > 0), (
+            "timeout must be greater than 0, but got timeout = " +
+            repr(timeout)
+        )
+        assert (policy in ("raise", "spill", "block")), (
+            "policy must be raise, spill or block, but got policy = " +
+            repr(policy)
+        )
+
+        self.limit = limit
+        self.policy = policy
+        self.sizeof = sizeof
+        self.timeout = timeout
+
+        self.used = 0
+        self.peak = 0
+        self.usage = collections.Counter()
+
+        self._cond = threading.Condition()
+        self._changes = 0
+
+    def size(self, item):
+        """ Gets how much an item counts against the budget. """
+
+        if self.sizeof is None:
+            return 1
+
+        return self.sizeof(item)
+
+    def acquire(self, name, size, policy=None):
+        """ Charges ``size`` to ``name`` if the budget allows it.
+
+        Args:
+
+            name(str):           What is buffering.
+            size(int):           How much it is buffering.
+            policy(str):         Overrides the budget's policy (also
+                                 ``"force"`` to charge regardless).
+
+        Returns:
+
+            bool:                Whether it was charged (``False`` only
+                                 under the ``"spill"`` policy).
+        """
+
+        if policy is None:
+            policy = self.policy
+
+        with self._cond:
+            while self.used and (self.used + size) > self.limit:
+                if policy == "force":
+                    break
+                elif policy == "spill":
+                    return False
+                elif policy == "block":
+                    changes = self._changes
+                    waited = self._cond.wait(self.timeout)
+                    if not waited and changes == self._changes:
+                        raise BudgetExceeded(
+                            "%s waited %r seconds for %r more, but %r of "
+                            "%r is used %r" % (
+                                name, self.timeout, size, self.used,
+                                self.limit, dict(self.usage)
+                            )
+                        )
+                else:
+                    raise BudgetExceeded(
+                        "%s needs %r more, but %r of %r is used %r" % (
+                            name, size, self.used, self.limit,
+                            dict(self.usage)
+                        )
+                    )
+
+            self.used += size
+            self.usage[name] += size
+            self.peak = max(self.peak, self.used)
+
+            return True
+
+    def has_room(self):
+        """ Whether anything more fits in the budget. """
+
+        with self._cond:
+            return not self.used or self.used < self.limit
+
+    def wait_for_room(self, changes=None):
+        """ Waits until ``has_room`` (e.g. for another thread).
+
+        Args:
+
+            changes(int):        Also stop waiting once ``notify`` or
+                                 ``release`` is called after ``_changes``
+                                 had this value.
+
+        Raises:
+
+            BudgetExceeded:      If nothing changes for ``timeout``
+                                 seconds.
+        """
+
+        with self._cond:
+            while self.used and self.used >= self.limit:
+                if changes is not None and changes != self._changes:
+                    break
+
+                before = self._changes
+                waited = self._cond.wait(self.timeout)
+                if not waited and before == self._changes:
+                    raise BudgetExceeded(
+                        "waited %r seconds, but %r of %r is still used "
+                        "%r" % (
+                            self.timeout, self.used, self.limit,
+                            dict(self.usage)
+                        )
+                    )
+
+    def notify(self):
+        """ Wakes up anything waiting on the budget to check again. """
+
+        with self._cond:
+            self._changes += 1
+            self._cond.notify_all()
+
+    def release(self, name, size):
+        """ Returns ``size`` charged to ``name`` to the budget. """
+
+        if not size:
+            return
+
+        with self._cond:
+            self.used -= size
+            self.usage[name] -= size
+            self._changes += 1
+            self._cond.notify_all()
+
+    def __enter__(self):
+        _push("budget", self)
+        return self
+
+    def __exit__(self, *args):
+        _pop("budget")
+
+
+def set_budget(budget):
+    """ Sets the memory budget for the whole process.
+
+    Threads use it outside of any ``with Budget(...)`` block.
+
+    Args:
+
+        budget(Budget):          Budget to use (``None`` for none).
+
+    Returns:
+
+        Budget:                  The budget used before.
+    """
+
+    old_budget = _options["budget"]
+    _options["budget"] = budget
+
+    return old_budget
+
+
+class Occupancy(object):
+    """ Live and peak number of items held by one buffer.
+
+    Attributes:
+
+        name(str):               What is buffering (e.g. ``"split"``).
+        live(int):               Items held now.
+        peak(int):               Most items held at once.
+    """
+
+    def __init__(self, name, metrics):
+        self.name = name
+        self.live = 0
+        self.peak = 0
+
+        self._metrics = metrics
+
+    def add(self, k=1):
+        self.live += k
+        self.peak = max(self.peak, self.live)
+        self._metrics._change(self, k)
+
+    def remove(self, k=1):
+        if not k:
+            return
+
+        self.live -= k
+        self._metrics._change(self, -k)
+
+    def __repr__(self):
+        return "<Occupancy %s live=%r peak=%r>" % (
+            self.name, self.live, self.peak
+        )
+
+
+class BufferMetrics(object):
+    """ Tracks how many items each of yail's buffers holds.
+
+    While active, every buffering construct in yail (the tees in
+    ``split``, ``cycles`` and ``disperse`` and the windows of
+    ``sliding_window_filled``) gets an ``Occupancy`` record. Live
+    records are in ``buffers``. Totals for each name are in ``live``
+    and ``peak``. If given, ``callback`` is called with a buffer's
+    ``Occupancy`` whenever it reaches a new peak.
+
+    Use it in a ``with`` block to apply it to that thread until the
+    block ends or pass it to ``set_metrics`` to apply it process-wide.
+
+    Args:
+
+        callback(callable):      Called on each buffer's new peaks.
+
+    Examples:
+
+        >>> from yail.core import split
+        >>> with BufferMetrics() as metrics:
+        ...     front, middle, back = split(10, iter(range(20)))
+        ...     front = list(front)
+        ...     (metrics.live["split"], metrics.peak["split"])
+        (10, 10)
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+
+        self.live = collections.Counter()
+        self.peak = collections.Counter()
+        self.buffers = weakref.WeakSet()
+
+        self._lock = threading.Lock()
+
+    def track(self, name):
+        """ Makes an ``Occupancy`` record for a new buffer. """
+
+        occupancy = Occupancy(name, self)
+        with self._lock:
+            self.buffers.add(occupancy)
+
+        return occupancy
+
+    def _change(self, occupancy, k):
+        name = occupancy.name
+        with self._lock:
+            self.live[name] += k
+            self.peak[name] = max(self.peak[name], self.live[name])
+
+        if k > 0 and occupancy.live == occupancy.peak and self.callback:
+            self.callback(occupancy)
+
+    def __enter__(self):
+        _push("metrics", self)
+        return self
+
+    def __exit__(self, *args):
+        _pop("metrics")
+
+
+def set_metrics(metrics):
+    """ Sets the buffer metrics for the whole process.
+
+    Threads use them outside of any ``with BufferMetrics(...)`` block.
+
+    Args:
+
+        metrics(BufferMetrics):  Metrics to use (``None`` for none).
+
+    Returns:
+
+        BufferMetrics:           The metrics used before.
+    """
+
+    old_metrics = _options["metrics"]
+    _options["metrics"] = metrics
+
+    return old_metrics
+
+
+@contextlib.contextmanager
+def spill_limit(limit):
+    """ Sets how many items ``tee`` holds in memory before spilling.
+
+    Applies to every ``tee`` created in the ``with`` block by its
+    thread, which includes those used inside ``split``, ``cycles`` and
+    ``disperse``.
+
+    Args:
+
+        limit(int):              Max items to hold in memory (``None``
+                                 to never spill).
+
+    Examples:
+
+        >>> with spill_limit(2):
+        ...     a, b = tee(range(5))
+        ...     list(a), list(b)
+        ([0, 1, 2, 3, 4], [0, 1, 2, 3, 4])
+    """
+
+    assert (limit is None or limit > 0), (
+        "limit must be greater than 0, but got limit = " + repr(limit)
+    )
+
+    _push("spill_limit", limit)
+    try:
+        yield
+    finally:
+        _pop("spill_limit")
+
+
+class _SpillFile(object):
+    """ FIFO of pickled items in a temporary file.
+
+    Items are appended to the end of the file and read back through a
+    memory map by their index from the front of the queue.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._offsets = array.array(_offset_type, [0])
+        self._first = 0
+        self._map = None
+
+    def __len__(self):
+        return len(self._offsets) - 1 - self._first
+
+    def append(self, item):
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+
+        self._file.seek(self._offsets[-1])
+        self._file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def __getitem__(self, i):
+        i += self._first
+        begin = self._offsets[i]
+        end = self._offsets[i + 1]
+
+        if self._map is None or len(self._map) < end:
+            self._file.flush()
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        return pickle.loads(self._map[begin:end])
+
+    def popleft(self):
+        item = self[0]
+        self.discard()
+
+        return item
+
+    def discard(self):
+        self._first += 1
+        if not len(self):
+            self.clear()
+        elif self._first > 1024 and 2 * self._first > len(self._offsets):
+            del self._offsets[:self._first]
+            self._first = 0
+
+    def clear(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+        self._file.seek(0)
+        self._file.truncate()
+        self._offsets = array.array(_offset_type, [0])
+        self._first = 0
+
+    def close(self):
+        self.clear()
+        self._file.close()
+
+
+class _Tee(object):
+    """ Items shared by ``tee`` branches, spilling to disk past a limit.
+
+    Holds every item read from the source that some branch has yet to
+    get. The oldest ``limit`` of these (or as many as the budget
+    allows) are kept in memory. The rest go to a ``_SpillFile`` and
+    are moved back into memory as the branches furthest behind catch
+    up.
+    """
+
+    def __init__(self, it, n, limit, budget, metrics, name):
+        self._spill = None
+        self._occupancy = metrics.track(name) if metrics else None
+        self._budget = budget
+        self._name = name
+        self._sizes = []
+        self._it = iter(it)
+        self._limit = limit
+        self._positions = n * [0]
+        self._base = 0
+        self._mem = []
+        self._head = 0
+        self._lock = threading.RLock()
+
+    def _keep(self, item, num_mem, policy=None):
+        """ Whether to keep an item in memory (charging the budget). """
+
+        if self._limit is not None and num_mem >= self._limit:
+            return False
+
+        if self._budget is not None:
+            size = self._budget.size(item)
+            if not self._budget.acquire(self._name, size, policy):
+                return False
+            self._sizes.append(size)
+
+        return True
+
+    def get(self, i):
+        blocking = (
+            self._budget is not None and self._budget.policy == "block"
+        )
+
+        while True:
+            with self._lock:
+                pos = self._positions[i]
+                offset = pos - self._base
+                num_mem = len(self._mem) - self._head
+                num_spill = len(self._spill) if self._spill else 0
+
+                if offset < num_mem:
+                    item = self._mem[self._head + offset]
+                    break
+                elif offset < num_mem + num_spill:
+                    item = self._spill[offset - num_mem]
+                    break
+                elif not blocking or self._budget.has_room():
+                    item = next(self._it)
+                    if not num_spill and self._keep(
+                            item, num_mem, ("force" if blocking else None)):
+                        self._mem.append(item)
+                    else:
+                        if self._spill is None:
+                            self._spill = _SpillFile()
+                        self._spill.append(item)
+                    if self._occupancy is not None:
+                        self._occupancy.add()
+                    if blocking:
+                        self._budget.notify()
+                    break
+
+                changes = self._budget._changes
+
+            # Wait outside the lock so other branches can catch up. Any
+            # item another branch reads in the meantime is a change too.
+            self._budget.wait_for_room(changes)
+
+        with self._lock:
+            self._positions[i] = pos + 1
+            if pos == self._base:
+                self._trim()
+
+        return item
+
+    def detach(self, i):
+        """ Stops buffering items for branch ``i``. """
+
+        with self._lock:
+            self._positions[i] = None
+            self._trim()
+
+    def _trim(self):
+        active = [p for p in self._positions if p is not None]
+        low = min(active) if active else (
+            self._base + len(self._mem) - self._head +
+            (len(self._spill) if self._spill else 0)
+        )
+
+        if self._occupancy is not None:
+            self._occupancy.remove(max(low - self._base, 0))
+
+        while self._base < low:
+            if self._head < len(self._mem):
+                self._mem[self._head] = None
+                if self._budget is not None:
+                    self._budget.release(self._name, self._sizes[self._head])
+                    self._sizes[self._head] = 0
+                self._head += 1
+            else:
+                self._spill.discard()
+            self._base += 1
+
+        if self._head == len(self._mem):
+            del self._mem[:]
+            del self._sizes[:]
+            self._head = 0
+
+            while self._spill:
+                if not self._keep(self._spill[0], len(self._mem), "spill"):
+                    break
+                self._mem.append(self._spill.popleft())
+        elif self._head > 1024 and 2 * self._head > len(self._mem):
+            del self._mem[:self._head]
+            del self._sizes[:self._head]
+            self._head = 0
+
+    def __del__(self):
+        if self._occupancy is not None:
+            self._occupancy.remove(self._occupancy.live)
+        if self._budget is not None:
+            self._budget.release(self._name, sum(self._sizes))
+            del self._sizes[:]
+        if self._spill is not None:
+            self._spill.close()
+
+
+class _TeeBranch(object):
+    def __init__(self, shared, i):
+        self._shared = shared
+        self._i = i
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._shared.get(self._i)
+
+    next = __next__
+
+    @property
+    def occupancy(self):
+        """ ``Occupancy`` of the buffer shared with the other branches.
+        """
+
+        return self._shared._occupancy
+
+    def __del__(self):
+        self._shared.detach(self._i)
+
+
+def tee(it, n=2, limit=None, name="tee"):
+    """ Splits an iterable into ``n`` independent iterators.
+
+    Same as ``itertools.tee``. However, if there is a limit, only that
+    many items read ahead by some iterators for the others are kept in
+    memory. Any more are pickled to a temporary file until needed.
+    Items kept in memory are also charged to the active ``Budget``.
+    With active ``BufferMetrics``, the branches' ``occupancy`` tells
+    how many items are buffered for them.
+
+    Note:
+
+        Without a limit, budget or metrics, this just is
+        ``itertools.tee``. When spilling, items must be picklable.
+
+    Args:
+
+        it(iterable):            Iterable to split.
+        n(int):                  Number of iterators to make.
+        limit(int):              Max items to hold in memory (defaults
+                                 to the one set by ``spill_limit``).
+        name(str):               What to charge the budget under.
+
+    Returns:
+
+        tuple:                   ``n`` iterators over ``it``.
+
+    Examples:
+
+        >>> a, b = tee(range(5), limit=2)
+        >>> list(a), list(b)
+        ([0, 1, 2, 3, 4], [0, 1, 2, 3, 4])
+    """
+
+    if limit is None:
+        limit = _option("spill_limit")
+
+    budget = _option("budget")
+    metrics = _option("metrics")
+
+    if (limit is None and budget is None and metrics is None) or n < 2:
+        return itertools.tee(it, n)
+
+    assert (limit is None or limit > 0), (
+        "limit must be greater than 0, but got limit = " + repr(limit)
+    )
+
+    shared = _Tee(it, n, limit, budget, metrics, name)
+
+    return tuple(_TeeBranch(shared, i) for i in range(n))
+
+
+def sliding_window(n, seq, name="sliding_window"):
+    """ A sliding window that charges its window to the budget.
+
+    Same as ``toolz.itertoolz.sliding_window``, but the items in the
+    window are charged to the active ``Budget`` and tracked by the
+    active ``BufferMetrics`` (if any).
+
+    Args:
+
+        n(int):                  Size of each window.
+        seq(iterable):           Sequence to take windows over.
+        name(str):               What to charge the budget under.
+
+    Returns:
+
+        iterable:                Windows of ``n`` items.
+
+    Examples:
+
+        >>> list(sliding_window(2, [1, 2, 3]))
+        [(1, 2), (2, 3)]
+    """
+
+    budget = _option("budget")
+    metrics = _option("metrics")
+
+    if budget is None and metrics is None:
+        return toolz.itertoolz.sliding_window(n, seq)
+
+    return _sliding_window_tracked(n, seq, budget, metrics, name)
+
+
+def _sliding_window_tracked(n, seq, budget, metrics, name):
+    if budget is None:
+        budget = Budget(float("inf"))
+
+    policy = "force" if budget.policy == "spill" else None
+    occupancy = metrics.track(name) if metrics else None
+
+    window = collections.deque()
+    sizes = collections.deque()
+    try:
+        for each in seq:
+            if len(window) == n:
+                window.popleft()
+                budget.release(name, sizes.popleft())
+                if occupancy is not None:
+                    occupancy.remove()
+
+            size = budget.size(each)
+            budget.acquire(name, size, policy)
+            window.append(each)
+            sizes.append(size)
+            if occupancy is not None:
+                occupancy.add()
+
+            if len(window) == n:
+                yield(tuple(window))
+    finally:
+        budget.release(name, sum(sizes))
+        if occupancy is not None:
+            occupancy.remove(occupancy.live)
@@ -0,0 +1,545 @@
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 14:05$"
+
+
+import collections
+import functools
+import inspect
+import json
+import logging
+import operator
+import math
+import threading
+import timeit
+
+try:
+    from collections.abc import Iterator
+except ImportError:
+    from collections import Iterator
+
+
+_options = {
+    "sink": None,
+}
+
+_profiling = {
+    "originals": None,
+    "profiles": collections.OrderedDict(),
+}
+
+_local = threading.local()
+
+
+class StageStats(object):
+    """ What one instrumented stage of a pipeline did.
+
+    Attributes:
+
+        name(str):               Name of the stage.
+        items(int):              Items yielded.
+        produce_time(float):     Seconds spent getting items from the
+                                 stage's input (i.e. working).
+        consume_time(float):     Seconds spent waiting on the consumer
+                                 to ask for the next item.
+        elapsed(float):          Seconds from the first to the last item.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.produce_time = 0.0
+        self.consume_time = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """ Items yielded per second (``0.0`` if no time passed). """
+
+        if not self.elapsed:
+            return 0.0
+
+        return self.items / self.elapsed
+
+    def as_dict(self):
+        """ Gets the stats as a ``dict`` (e.g. for JSON). """
+
+        return collections.OrderedDict([
+            ("name", self.name),
+            ("items", self.items),
+            ("produce_time", self.produce_time),
+            ("consume_time", self.consume_time),
+            ("elapsed", self.elapsed),
+            ("throughput", self.throughput),
+        ])
+
+    def __repr__(self):
+        return (
+            "<StageStats %s items=%r produce_time=%.6f consume_time=%.6f>" % (
+                self.name, self.items, self.produce_time, self.consume_time
+            )
+        )
+
+
+class Registry(object):
+    """ Sink keeping the stats of every stage in memory.
+
+    Examples:
+
+        >>> from yail.core import generator
+        >>> registry = Registry()
+        >>> list(generator(range(3), name="source", sink=registry))
+        [0, 1, 2]
+        >>> [(s.name, s.items) for s in registry["source"]]
+        [('source', 3)]
+    """
+
+    def __init__(self):
+        self.stages = collections.OrderedDict()
+
+        self._lock = threading.Lock()
+
+    def __call__(self, stats):
+        with self._lock:
+            self.stages.setdefault(stats.name, []).append(stats)
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    def __len__(self):
+        return len(self.stages)
+
+    def clear(self):
+        """ Forgets all stats recorded so far. """
+
+        with self._lock:
+            self.stages.clear()
+
+
+class LoggingSink(object):
+    """ Sink logging the stats of every stage.
+
+    Args:
+
+        logger(Logger):          Where to log (the ``"yail"`` logger by
+                                 default).
+        level(int):              Level to log at.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        if logger is None:
+            logger = logging.getLogger("yail")
+
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, stats):
+        self.logger.log(
+            self.level,
+            "%s: %d items, %.6fs producing, %.6fs waiting on consumer, "
+            "%.1f items/s",
+            stats.name, stats.items, stats.produce_time,
+            stats.consume_time, stats.throughput
+        )
+
+
+class FileSink(object):
+    """ Sink appending the stats of every stage to a file as JSON lines.
+
+    Args:
+
+        path(str):               File to append to.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self._lock = threading.Lock()
+
+    def __call__(self, stats):
+        line = json.dumps(stats.as_dict()) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+
+registry = Registry()
+
+
+def set_sink(sink):
+    """ Sets where instrumented stages report by default.
+
+    Without one, stages report to the module's ``registry``.
+
+    Args:
+
+        sink(callable):          Called with each stage's ``StageStats``
+                                 (``None`` for ``registry``).
+
+    Returns:
+
+        callable:                The sink used before.
+    """
+
+    old_sink = _options["sink"]
+    _options["sink"] = sink
+
+    return old_sink
+
+
+def report(stats, sink=None):
+    """ Sends a stage's stats to ``sink`` or the default sink. """
+
+    if sink is None:
+        sink = _options["sink"]
+    if sink is None:
+        sink = registry
+
+    sink(stats)
+
+
+class Histogram(object):
+    """ Latencies in log-scaled buckets for estimating percentiles.
+
+    Each bucket is ``2 ** (1 / 4)`` (about 19%) wider than the one
+    before, starting at a nanosecond. So memory stays fixed however
+    many latencies are added and percentiles are within about 19%.
+
+    Examples:
+
+        >>> h = Histogram()
+        >>> for each in range(1, 101):
+        ...     h.add(each * 1e-6)
+        >>> h.count
+        100
+        >>> 45e-6 < h.percentile(50) < 60e-6
+        True
+        >>> 95e-6 < h.percentile(99) < 120e-6
+        True
+    """
+
+    _base = 2 ** 0.25
+    _start = 1e-9
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = collections.Counter()
+
+    def add(self, latency):
+        """ Adds a latency (in seconds). """
+
+        i = 0
+        if latency > self._start:
+            i = int(math.ceil(math.log(latency / self._start, self._base)))
+
+        self.count += 1
+        self.total += latency
+        self.buckets[i] += 1
+
+    def percentile(self, q):
+        """ Estimates the ``q``th percentile (``0.0`` if empty).
+
+        Args:
+
+            q(float):            Percentile to get (from 0 to 100).
+
+        Returns:
+
+            float:               Upper bound of the bucket it falls in.
+        """
+
+        assert (0 <= q <= 100), (
+            "q must be from 0 to 100, but got q = " + repr(q)
+        )
+
+        if not self.count:
+            return 0.0
+
+        rank = max(int(math.ceil(self.count * q / 100.0)), 1)
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen >= rank:
+                break
+
+        return self._start * self._base ** i
+
+
+class FunctionProfile(object):
+    """ What calls to one profiled function did.
+
+    Attributes:
+
+        name(str):               Name of the function.
+        calls(int):              Times it was called.
+        elements(int):           Items yielded by what it returned.
+        call_latency(Histogram): Seconds per call, including pulling all
+                                 items from what it returned.
+        element_latency(Histogram): Seconds to get each item.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.elements = 0
+        self.call_latency = Histogram()
+        self.element_latency = Histogram()
+
+        self._lock = threading.Lock()
+
+    def as_dict(self):
+        """ Gets the counts and p50/p99 latencies as a ``dict``. """
+
+        with self._lock:
+            return collections.OrderedDict([
+                ("name", self.name),
+                ("calls", self.calls),
+                ("elements", self.elements),
+                ("call_p50", self.call_latency.percentile(50)),
+                ("call_p99", self.call_latency.percentile(99)),
+                ("element_p50", self.element_latency.percentile(50)),
+                ("element_p99", self.element_latency.percentile(99)),
+            ])
+
+    def __repr__(self):
+        return "<FunctionProfile %s calls=%r elements=%r>" % (
+            self.name, self.calls, self.elements
+        )
+
+
+class _ProfiledIterator(object):
+    """ Times each item pulled from an iterator a profiled call returned.
+
+    Other attributes (e.g. ``advance``) are looked up on the iterator.
+    """
+
+    def __init__(self, it, profile, elapsed):
+        self._it = it
+        self._profile = profile
+        self._elapsed = elapsed
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        clock = timeit.default_timer
+        active = getattr(_local, "active", False)
+        _local.active = True
+        try:
+            start = clock()
+            each = next(self._it)
+        except StopIteration:
+            self._finish()
+            raise
+        finally:
+            _local.active = active
+        latency = clock() - start
+
+        profile = self._profile
+        with profile._lock:
+            profile.elements += 1
+            profile.element_latency.add(latency)
+        self._elapsed += latency
+
+        return each
+
+    next = __next__
+
+    def __length_hint__(self):
+        hint = getattr(self._it, "__length_hint__", None)
+        if hint is None:
+            return NotImplemented
+
+        return hint()
+
+    def __getattr__(self, name):
+        return getattr(self._it, name)
+
+    def __reduce__(self):
+        return self._it.__reduce__()
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            with self._profile._lock:
+                self._profile.call_latency.add(self._elapsed)
+
+    def close(self):
+        self._finish()
+        getattr(self._it, "close", lambda: None)()
+
+    def __del__(self):
+        self._finish()
+
+
+class _ProfiledSequence(_ProfiledIterator):
+    """ A ``_ProfiledIterator`` that also forwards lookups.
+
+    ``len``, indexing and ``in`` go to the iterator, so profiling does
+    not change what they give (or consume items to find them).
+    """
+
+    def _lookup(self, func, *args):
+        active = getattr(_local, "active", False)
+        _local.active = True
+        try:
+            return func(*args)
+        finally:
+            _local.active = active
+
+    def __bool__(self):
+        return True
+
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        return self._lookup(len, self._it)
+
+    def __getitem__(self, i):
+        return self._lookup(operator.getitem, self._it, i)
+
+    def __contains__(self, x):
+        return self._lookup(operator.contains, self._it, x)
+
+
+def _profiled(func, profile):
+    """ Wraps ``func`` to record its calls to ``profile``. """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Calls within ``yail.core`` are part of the outer call.
+        if getattr(_local, "active", False):
+            return func(*args, **kwargs)
+
+        with profile._lock:
+            profile.calls += 1
+
+        # Hand ``func`` what profiled calls returned, not our wrappers,
+        # and give back what was passed in if ``func`` returns it.
+        passed = {}
+        unwrapped = []
+        for each in args:
+            inner = each
+            if isinstance(each, _ProfiledIterator):
+                inner = each._it
+            passed[id(inner)] = each
+            unwrapped.append(inner)
+        args = tuple(unwrapped)
+
+        _local.active = True
+        try:
+            start = timeit.default_timer()
+            result = func(*args, **kwargs)
+            elapsed = timeit.default_timer() - start
+        finally:
+            _local.active = False
+
+        if id(result) in passed:
+            result = passed[id(result)]
+        elif isinstance(result, Iterator):
+            if hasattr(type(result), "__getitem__"):
+                return _ProfiledSequence(result, profile, elapsed)
+
+            return _ProfiledIterator(result, profile, elapsed)
+
+        with profile._lock:
+            profile.call_latency.add(elapsed)
+
+        return result
+
+    return wrapper
+
+
+def enable_profiling():
+    """ Starts profiling every public function in ``yail.core``.
+
+    Each function is swapped for a wrapper that counts calls, counts
+    the items yielded by what it returns and records latencies per call
+    and per item (see ``profiles``). Only code that looks the functions
+    up on ``yail.core`` after this (including ``yail.core`` itself) sees
+    the wrappers. Iterators returned while profiling are wrapped too
+    (so ``generator`` no longer returns a generator type), but they are
+    unwrapped when passed back to ``yail.core`` or pickled. Until this
+    is called, nothing is wrapped and profiling costs nothing.
+
+    Examples:
+
+        >>> import yail.core
+        >>> enable_profiling()
+        >>> list(yail.core.duplicate(range(3), 2))
+        [0, 0, 1, 1, 2, 2]
+        >>> disable_profiling()
+        >>> profile = profiles()["duplicate"]
+        >>> (profile.calls, profile.elements)
+        (1, 6)
+        >>> reset_profiles()
+    """
+
+    from . import core
+
+    if _profiling["originals"] is not None:
+        return
+
+    originals = collections.OrderedDict()
+    for name, func in list(vars(core).items()):
+        if (name.startswith("_") or
+                not inspect.isfunction(func) or
+                func.__module__ != core.__name__):
+            continue
+
+        profile = _profiling["profiles"].get(name)
+        if profile is None:
+            profile = _profiling["profiles"][name] = FunctionProfile(name)
+
+        originals[name] = func
+        setattr(core, name, _profiled(func, profile))
+
+    _profiling["originals"] = originals
+
+
+def disable_profiling():
+    """ Puts back the original functions in ``yail.core``.
+
+    The profiles recorded so far are kept (see ``reset_profiles``).
+    """
+
+    from . import core
+
+    originals = _profiling["originals"]
+    if originals is None:
+        return
+
+    for name, func in originals.items():
+        setattr(core, name, func)
+
+    _profiling["originals"] = None
+
+
+def is_profiling():
+    """ Whether ``enable_profiling`` is in effect. """
+
+    return _profiling["originals"] is not None
+
+
+def profiles():
+    """ Gets the ``FunctionProfile`` of each function profiled so far.
+    """
+
+    return collections.OrderedDict(
+        (name, profile)
+        for name, profile in _profiling["profiles"].items()
+        if profile.calls
+    )
+
+
+def reset_profiles():
+    """ Forgets everything profiled so far. """
+
+    _profiling["profiles"].clear()
+    if _profiling["originals"] is not None:
+        disable_profiling()
+        enable_profiling()
@@ -0,0 +1,383 @@
+__author__ = "John Kirkham <kirkhamj@janelia.hhmi.org>"
+__date__ = "$Oct 19, 2026 19:40$"
+
+
+import itertools
+import threading
+
+from . import core
+
+from builtins import (
+    range,
+)
+
+
+# Stages done element by element, which are fused into one loop.
+_FUSABLE = frozenset(["map", "filter", "duplicate"])
+
+# Stages computing items by position when their input is a sequence.
+_POSITIONAL = frozenset([
+    "pad", "duplicate", "cycles", "sliding_window_filled", "disperse"
+])
+
+# Most times the last ``duplicate`` is unrolled into repeated ``yield``s.
+_UNROLL = 4
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def _signature(stages):
+    """ What the fused loop's code depends on for these stages. """
+
+    signature = []
+    for i, (kind, args) in enumerate(stages):
+        unroll = None
+        if (kind == "duplicate" and i == len(stages) - 1 and
+                0 < args[0] <= _UNROLL):
+            unroll = args[0]
+        signature.append((kind, unroll))
+
+    return tuple(signature)
+
+
+def _compile(signature):
+    """ Writes one generator function running all of the stages.
+
+    Each stage turns ``x<i>`` into ``x<i + 1>`` (or drops it), nesting
+    the stages after it inside of it. Stage ``i``'s argument is
+    ``p<i>``. For example, a ``duplicate`` followed by a ``filter``
+    is compiled into this::
+
+        def fused(it, params):
+            p0, p1, = params
+            for x0 in it:
+                for x1 in repeat(x0, p0):
+                    if not p1(x1):
+                        continue
+                    x2 = x1
+                    yield x2
+    """
+
+    lines = [
+        "def fused(it, params):",
+        "    %s, = params" % ", ".join(
+            "p%d" % i for i in range(len(signature))
+        ),
+    ]
+    lines.append("    for x0 in it:")
+    indent = "        "
+    for i, (kind, unroll) in enumerate(signature):
+        args = dict(i=i, j=(i + 1))
+        if kind == "map":
+            lines.append(indent + "x%(j)d = p%(i)d(x%(i)d)" % args)
+        elif kind == "filter":
+            lines.append(indent + "if not p%(i)d(x%(i)d):" % args)
+            lines.append(indent + "    continue")
+            lines.append(indent + "x%(j)d = x%(i)d" % args)
+        elif unroll is not None:
+            lines.extend(unroll * [indent + "yield x%(i)d" % args])
+            break
+        else:
+            lines.append(
+                indent + "for x%(j)d in repeat(x%(i)d, p%(i)d):" % args
+            )
+            indent += "    "
+    else:
+        lines.append(indent + "yield x%d" % len(signature))
+
+    namespace = {"repeat": itertools.repeat}
+    exec("\n".join(lines), namespace)
+
+    return namespace["fused"]
+
+
+def _fuse(it, stages):
+    """ Runs the stages over ``it`` in one generator (if any). """
+
+    if not stages:
+        return it
+
+    signature = _signature(stages)
+    with _compiled_lock:
+        fused = _compiled.get(signature)
+        if fused is None:
+            fused = _compiled[signature] = _compile(signature)
+
+    return fused(it, tuple(args[0] for kind, args in stages))
+
+
+def _is_identity(kind, args):
+    if kind in ("duplicate", "cycles"):
+        return args[0] == 1
+    elif kind == "pad":
+        return args[0] == 0 and args[1] == 0
+
+    return False
+
+
+def _add(a, b):
+    if a is None or b is None:
+        return None
+
+    return a + b
+
+
+def _merge(first, second):
+    """ Gets one stage doing both stages (or ``None`` if there is none).
+    """
+
+    (kind, args), (other_kind, other_args) = first, second
+    if kind != other_kind:
+        return None
+
+    if kind == "duplicate":
+        return (kind, (args[0] * other_args[0],))
+    elif kind == "cycles":
+        n, m = args[0], other_args[0]
+        if n == 0 or m == 0:
+            return (kind, (0,))
+        elif n is None or m is None:
+            return (kind, (None,))
+
+        return (kind, (n * m,))
+    elif kind == "pad" and args[2] is other_args[2]:
+        # Padding what is padded on an end without end adds nothing.
+        return (kind, (
+            _add(args[0], other_args[0]),
+            _add(args[1], other_args[1]),
+            args[2]
+        ))
+
+    return None
+
+
+def _simplify(stages):
+    """ Rewrites the stages as fewer stages giving the same items.
+
+    Drops stages that change nothing and merges consecutive stages of
+    the same kind where the result is the same.
+
+    Examples:
+
+        >>> _simplify([("duplicate", (2,)), ("duplicate", (3,)),
+        ...            ("cycles", (1,)), ("pad", (1, 0, None)),
+        ...            ("pad", (2, 3, None))])
+        (('duplicate', (6,)), ('pad', (3, 3, None)))
+    """
+
+    result = []
+    for stage in stages:
+        if _is_identity(*stage):
+            continue
+
+        merged = _merge(result[-1], stage) if result else None
+        if merged is not None:
+            result[-1] = merged
+        else:
+            result.append(stage)
+
+    return tuple(result)
+
+
+def _sized(it):
+    """ Gets a sequence of what is left of a finite ``_Positional``. """
+
+    if isinstance(it, core._Positional) and it._length is not None:
+        return core._Sequenced(it)
+
+    return it
+
+
+def _evaluate(source, stages):
+    """ Runs the stages over ``source`` (lazily).
+
+    While the input of a stage is a sequence (e.g. ``range`` or a
+    ``list``), yail computes each of its items by position. Its result
+    is then passed to the next stage as a sequence too, so the items
+    of the whole chain are computed from positions in ``source``
+    without buffering. A ``duplicate`` is only kept positional when a
+    stage after it needs that. Otherwise it is fused with the stages
+    around it.
+
+    Returns:
+
+        iterable:                The items, as a sequence if possible.
+    """
+
+    it = _sized(source)
+    run = []
+    for i, (kind, args) in enumerate(stages):
+        positional = False
+        if kind == "duplicate" and not run and core._is_sequence(it):
+            later = [k for k, a in stages[i + 1:] if k != "duplicate"]
+            positional = bool(later) and later[0] in _POSITIONAL
+
+        if kind in _FUSABLE and not positional:
+            run.append((kind, args))
+            continue
+
+        it = _sized(getattr(core, kind)(_fuse(it, run), *args))
+        run = []
+
+    return _fuse(it, run)
+
+
+class Stream(object):
+    """ A chain of yail calls run as one fused pipeline.
+
+    Each method records a stage and returns a new ``Stream``, leaving
+    this one as is. Nothing runs until the ``Stream`` is iterated. Then
+    consecutive ``map``, ``filter`` and ``duplicate`` stages are fused
+    into a single generator loop, so each item passes through one
+    generator instead of one per stage. The other stages
+    are done by their yail functions between fused loops (or first, on
+    the source itself, to use their fast paths). So windows still come
+    from ``sliding_window_filled``'s C-level iterators and are charged
+    to any active ``Budget``.
+
+    Before running, stages are simplified (e.g. ``duplicate(2)``
+    followed by ``duplicate(3)`` becomes ``duplicate(6)``, see
+    ``optimize``). If the source is sized (a sequence or a finite yail
+    iterator like ``subrange``), the stages that compute their items by
+    position get the output of the stage before as a sequence. So a
+    chain like ``cycles`` of ``duplicate``, ``split`` of ``pad`` or a
+    window of ``subrange`` is computed arithmetically from positions
+    in the source, with nothing buffered, and the result keeps
+    ``advance``, ``state`` and ``__length_hint__``. The items of a
+    sized yail iterator are looked up instead of consuming it. Use
+    ``iterator`` to get the result with its ``advance`` and ``state``.
+
+    The result is the same as nesting the yail calls. A ``Stream`` can
+    be iterated again if its source can.
+
+    Args:
+
+        source(iterable):        What to stream.
+
+    Examples:
+
+        >>> s = Stream(range(4)).pad(1, 1, fill=0).window(2).duplicate(2)
+        >>> list(s)  # doctest: +NORMALIZE_WHITESPACE
+        [(0, 0), (0, 0), (0, 1), (0, 1), (1, 2), (1, 2), (2, 3), (2, 3),
+         (3, 0), (3, 0)]
+
+        >>> list(Stream(range(10)).filter(lambda x: x % 3).map(str))
+        ['1', '2', '4', '5', '7', '8']
+    """
+
+    def __init__(self, source, stages=()):
+        self.source = source
+        self.stages = tuple(stages)
+
+    def _then(self, kind, *args):
+        return Stream(self.source, self.stages + ((kind, args),))
+
+    def map(self, func):
+        """ Applies ``func`` to each item. """
+
+        return self._then("map", func)
+
+    def filter(self, pred):
+        """ Keeps the items ``pred`` is true for (or that are true). """
+
+        if pred is None:
+            pred = bool
+
+        return self._then("filter", pred)
+
+    def pad(self, before=0, after=0, fill=None):
+        """ Pads the items like ``yail.core.pad``. """
+
+        return self._then("pad", before, after, fill)
+
+    def window(self, n, pad_before=False, pad_after=False, fillvalue=None):
+        """ Slides a window like ``yail.core.sliding_window_filled``. """
+
+        return self._then(
+            "sliding_window_filled", n, pad_before, pad_after, fillvalue
+        )
+
+    def duplicate(self, n=1):
+        """ Repeats each item like ``yail.core.duplicate``. """
+
+        assert (n >= 0), "n must be positive, but got n = " + repr(n)
+
+        return self._then("duplicate", n)
+
+    def cycles(self, n=1):
+        """ Cycles through the items like ``yail.core.cycles``. """
+
+        return self._then("cycles", n)
+
+    def disperse(self):
+        """ Reorders the items like ``yail.core.disperse``. """
+
+        return self._then("disperse")
+
+    def split(self, n):
+        """ Splits the items around item ``n`` like ``yail.core.split``.
+
+        Returns:
+
+            tuple:               A ``Stream`` of each portion.
+
+        Examples:
+
+            >>> front, middle, back = Stream(range(5)).pad(2).split(3)
+            >>> (list(front), list(middle), list(back))
+            ([None, None, 0], [1], [2, 3, 4])
+        """
+
+        return tuple(
+            Stream(each)
+            for each in core.split(n, _evaluate(self.source, self._plan()))
+        )
+
+    def optimize(self):
+        """ Gets the simplified ``Stream`` that is run when iterating.
+
+        Examples:
+
+            >>> Stream(range(3)).cycles(2).cycles(3).pad(1).optimize()
+            Stream(range(0, 3)).cycles(6).pad(1, 0, None)
+        """
+
+        return Stream(self.source, self._plan())
+
+    def _plan(self):
+        return _simplify(self.stages)
+
+    def iterator(self):
+        """ Gets the yail iterator running the stages.
+
+        Unlike ``iter``, this keeps ``advance``, ``state`` and
+        ``__length_hint__`` of the last stage's result where it has
+        them. Iterating it runs Python code for each item though.
+
+        Examples:
+
+            >>> it = Stream(range(5)).duplicate(2).cycles(2).iterator()
+            >>> it.advance(3)
+            >>> (next(it), it.__length_hint__())
+            (1, 16)
+        """
+
+        it = _evaluate(self.source, self._plan())
+        if isinstance(it, core._Sequenced):
+            it = it.positional
+        elif it is self.source:
+            it = iter(it)
+
+        return it
+
+    def __iter__(self):
+        # Goes straight to the underlying iterator (e.g. ``compress``),
+        # so no Python code runs per item of a ``for`` loop.
+        return iter(self.iterator())
+
+    def __repr__(self):
+        return "Stream(%r)%s" % (self.source, "".join(
+            ".%s(%s)" % (kind, ", ".join(map(repr, args)))
+            for kind, args in self.stages
+        ))